@@ -0,0 +1,58 @@
+# Run with Python 3
+# Measure HTML to Markdown conversion throughput on real course step texts
+import sys
+import time
+from stepik_export import api, html_markdown, settings
+from stepik_export.cli import read_credentials, default_config_file
+
+# Enter parameters below (largest text-heavy courses):
+course_ids = [253149]
+repeats = 3
+
+def collect_texts(course_id: int) -> list:
+    """Fetch all step HTML texts (and choice options) of a course"""
+    course_data = api.fetch_object('course', course_id)
+    sections = api.fetch_objects('section', course_data['sections'])
+    units = api.fetch_objects('unit', [unit_id for section in sections for unit_id in section['units']])
+    lessons = api.fetch_objects('lesson', [unit['lesson'] for unit in units])
+    step_ids = [step_id for lesson in lessons for step_id in lesson['steps']]
+    texts = []
+    for step_source in api.fetch_objects('step-source', step_ids):
+        block = step_source['block']
+        texts.append(block.get('text') or '')
+        texts += [option.get('text') or '' for option in block.get('options') or []]
+    return [text for text in texts if text]
+
+def run(texts: list) -> float:
+    """Convert all texts, return seconds"""
+    started = time.perf_counter()
+    for text in texts:
+        html_markdown.html_to_markdown(text)
+    return time.perf_counter() - started
+
+def main():
+    """Main function"""
+    if not api.authorize(*read_credentials(default_config_file)):
+        print('Unable to authorize: set STEPIK_CLIENT_ID and STEPIK_CLIENT_SECRET')
+        sys.exit(1)
+
+    # Measure conversion itself, not the disk cache
+    settings.markdown_cache_dir = None
+
+    for course_id in course_ids:
+        texts = collect_texts(course_id)
+        size_mb = sum(len(text.encode('utf-8')) for text in texts) / 1e6
+        print(f"Course {course_id}: {len(texts)} texts, {size_mb:.2f} MB of HTML")
+
+        cold = []
+        for _ in range(repeats):
+            html_markdown.markdown_cache.clear()
+            cold.append(run(texts))
+        warm = run(texts)
+
+        best = min(cold)
+        print(f"  convert: {best:.3f} s, {len(texts) / best:.0f} texts/s, {size_mb / best:.2f} MB/s")
+        print(f"  cached:  {warm:.3f} s, {len(texts) / max(warm, 1e-9):.0f} texts/s")
+
+if __name__ == "__main__":
+    main()
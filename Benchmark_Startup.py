@@ -0,0 +1,50 @@
+# Run with Python 3
+# Measure start-up time of stepik-export; exits with 1 if a budget is exceeded
+# or importing the command line loads heavy modules
+import sys
+import time
+import subprocess
+
+# Enter parameters below:
+output_dir = 'courses'  # exported courses for the --menu run
+repeats = 10
+budgets_ms = {'import': 50, '--help': 80, '--menu': 150}  # over interpreter start-up
+heavy_modules = ['requests', 'urllib3', 'yaml', 'sqlite3', 'concurrent.futures.process']
+
+runs = {
+    'import': ['-c', 'import stepik_export.cli'],
+    '--help': ['-m', 'stepik_export', '--help'],
+    '--menu': ['-m', 'stepik_export', '--menu', '-o', output_dir],
+}
+
+def best_time(args: list) -> float:
+    """Fastest of repeated runs of python with args, seconds"""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def main():
+    """Main function"""
+    ok = True
+    loaded = subprocess.run(
+        [sys.executable, '-c', 'import sys, stepik_export.cli; '
+                               f'print(" ".join(m for m in {heavy_modules!r} if m in sys.modules))'],
+        capture_output=True, text=True, check=True).stdout.split()
+    if loaded:
+        print(f"Importing stepik_export.cli loads: {', '.join(loaded)}")
+        ok = False
+
+    baseline = best_time(['-c', 'pass'])
+    print(f"Interpreter start-up: {baseline * 1000:.0f} ms")
+    for name, args in runs.items():
+        elapsed = (best_time(args) - baseline) * 1000
+        over = elapsed > budgets_ms[name]
+        ok = ok and not over
+        print(f"  {name:<8}{elapsed:6.0f} ms  (budget {budgets_ms[name]} ms){'  OVER' if over else ''}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
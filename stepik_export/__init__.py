@@ -0,0 +1,15 @@
+# Export Stepik courses as seen in left menu to YAML and markdown files
+import importlib
+
+__version__ = '0.1.0'
+
+# Loaded on first use, so that the command line starts fast
+lazy_names = {
+    'Course': 'models', 'Section': 'models', 'Lesson': 'models', 'Step': 'models',
+    'CourseChange': 'diff', 'diff_courses': 'diff',
+}
+
+def __getattr__(name):
+    if name in lazy_names:
+        return getattr(importlib.import_module(f'.{lazy_names[name]}', __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,5 @@
+# python -m stepik_export
+import sys
+from .cli import main
+
+sys.exit(main())
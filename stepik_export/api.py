@@ -0,0 +1,425 @@
+# Stepik API access: token, batched object fetching, course discovery, updates
+import json
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Optional, Iterator, Tuple
+
+from . import settings
+from .errors import ErrorLog
+from .httpcache import CachedResponse, ResponseCache
+from .journal import ExportJournal
+
+try:
+    # Several times faster than json on large step-source batches
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Fields of API objects used by the model, stats and renderers; the rest is
+# dropped right after decoding. A nested dict trims a nested object (or
+# each object of a list), None keeps the value as is.
+object_fields = {
+    'course': {'id': None, 'title': None, 'sections': None, 'update_date': None, 'progress': None},
+    'section': {'id': None, 'position': None, 'title': None, 'units': None, 'update_date': None,
+                'progress': None},
+    'unit': {'id': None, 'section': None, 'lesson': None, 'position': None, 'progress': None},
+    'lesson': {'id': None, 'title': None, 'steps': None, 'update_date': None},
+    'step': {'id': None, 'lesson': None, 'position': None, 'block': {'name': None}, 'progress': None},
+    'step-source': {'id': None, 'block': {
+        'name': None, 'text': None, 'code': None,
+        'video': {'urls': {'url': None, 'quality': None}},
+        'options': {'text': None, 'is_correct': None}}},
+    'progress': {'id': None, 'n_steps': None, 'n_steps_passed': None, 'is_passed': None},
+}
+# API names of classes that are not just class + 's'
+plural_names = {'progress': 'progresses'}
+
+# Keep connections to api_host open between requests
+session = requests.Session()
+token = None
+token_expires_at = 0.0
+token_lock = threading.Lock()
+credentials = ('', '')
+# (seconds, class, count, bytes) of every batch fetched while profiling
+batch_log: Optional[list] = None
+# Responses by settings.response_cache_file, opened on first use
+response_caches: Dict[Path, ResponseCache] = {}
+response_caches_lock = threading.Lock()
+# Object requests of this run: sent, answered 304 from the cache, bytes received
+transfer_stats = {'requests': 0, 'not_modified': 0, 'bytes': 0}
+
+def get_token() -> Optional[str]:
+    """Get a new access token with the credentials given to authorize()"""
+    global token_expires_at
+    auth = requests.auth.HTTPBasicAuth(*credentials)
+    response = session.post(f'{settings.api_host}/oauth2/token/',
+                            data={'grant_type': 'client_credentials'},
+                            auth=auth)
+    data = response.json()
+    token_expires_at = time.time() + data.get('expires_in', 36000)
+    return data.get('access_token', None)
+
+def authorize(client_id: str, client_secret: str) -> bool:
+    """Get a token for API requests; False if credentials are not accepted"""
+    global token, credentials
+    credentials = (client_id, client_secret)
+    token = get_token()
+    return token is not None
+
+class AuthorizationError(RuntimeError):
+    """Credentials were not accepted"""
+
+def set_credentials(client_id: str, client_secret: str):
+    """Remember credentials; the token is requested along with the first API request"""
+    global token, credentials
+    credentials = (client_id, client_secret)
+    token = None
+
+def auth_headers() -> dict:
+    """Authorization header for API requests, getting a token first if there is none"""
+    global token
+    with token_lock:
+        if token is None:
+            token = get_token()
+            if token is None:
+                raise AuthorizationError('Unable to authorize with provided credentials')
+    return {'Authorization': f'Bearer {token}'}
+
+def refresh_token():
+    """Renew token shortly before it expires (for long-running watch mode)"""
+    global token
+    if time.time() > token_expires_at - 300:
+        token = get_token() or token
+
+def plural(obj_class: str) -> str:
+    """Name of obj_class in API URLs and responses"""
+    return plural_names.get(obj_class, f'{obj_class}s')
+
+def trim(value, fields: Optional[dict]):
+    """Keep only fields of value (a dict or list of dicts)"""
+    if fields is None:
+        return value
+    if isinstance(value, list):
+        return [trim(item, fields) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {name: trim(value[name], nested) for name, nested in fields.items() if name in value}
+
+def trim_object(obj_class: str, obj: dict) -> dict:
+    """Object with only the fields the export uses (all fields for unknown classes)"""
+    return trim(obj, object_fields.get(obj_class))
+
+def decode_objects(obj_class: str, content: bytes, trimmed: bool = True) -> List[dict]:
+    """Objects of obj_class from response body"""
+    objs = json_loads(content)[plural(obj_class)]
+    return [trim_object(obj_class, obj) for obj in objs] if trimmed else objs
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Cache of API responses, None if disabled"""
+    path = settings.response_cache_file
+    if path is None:
+        return None
+    with response_caches_lock:
+        if path not in response_caches:
+            response_caches[path] = ResponseCache(path)
+        return response_caches[path]
+
+def get_content(api_url: str, obj_class: str = '', obj_ids: List = ()) -> Tuple[int, bytes, bool]:
+    """GET api_url: status, body and whether the body came from the cache.
+    
+    A cached response is revalidated with its ETag / Last-Modified, so an
+    unchanged one is answered with a bodiless 304 and served from the cache.
+    """
+    cache = get_response_cache()
+    cached = cache.get(api_url) if cache else None
+    headers = auth_headers()
+    if cached:
+        headers.update(cached.validators())
+    response = session.get(api_url, headers=headers, timeout=settings.request_timeout)
+    transfer_stats['requests'] += 1
+    transfer_stats['bytes'] += len(response.content)
+    if cached and response.status_code == 304:
+        transfer_stats['not_modified'] += 1
+        cache.touch(api_url)
+        return 200, cached.body, True
+    etag = response.headers.get('ETag', '')
+    last_modified = response.headers.get('Last-Modified', '')
+    if cache and response.status_code == 200 and (etag or last_modified):
+        cache.put(api_url, CachedResponse(response.content, etag, last_modified), obj_class, obj_ids)
+    return response.status_code, response.content, False
+
+def fetch_object(obj_class: str, obj_id: int, journal: Optional[ExportJournal] = None) -> dict:
+    """Fetch single object from Stepik API"""
+    if journal:
+        cached = journal.get_objects(obj_class, [obj_id])
+        if cached:
+            return cached[0]
+    api_url = f'{settings.api_host}/api/{plural(obj_class)}/{obj_id}'
+    _, content, _ = get_content(api_url)
+    obj = decode_objects(obj_class, content)[0]
+    if journal:
+        journal.record_batch(obj_class, [obj])
+    return obj
+
+@dataclass
+class BatchSizer:
+    """Adaptive number of ids per request for one object class"""
+    size: int
+    min_size: int
+    max_size: int
+    
+    def fit(self, base_url: str, obj_ids: List[int]) -> int:
+        """Number of ids from obj_ids to request next, limited by max_url_length"""
+        count = 0
+        url_length = len(base_url)
+        for obj_id in obj_ids[:self.size]:
+            url_length += len(f'ids[]={obj_id}&')
+            if url_length > settings.max_url_length and count >= 1:
+                break
+            count += 1
+        return count
+    
+    def record(self, count: int, seconds: float, num_bytes: int):
+        """Grow or shrink size after a successful request of count ids"""
+        if count < self.size:
+            # Short batch (end of list or URL limit) says nothing about the size
+            if seconds <= settings.target_batch_seconds and num_bytes <= settings.target_batch_bytes:
+                return
+        ratio = min(settings.target_batch_seconds / max(seconds, 1e-3),
+                    settings.target_batch_bytes / max(num_bytes, 1))
+        if ratio < 1:
+            new_size = int(count * ratio)
+        elif ratio > 2:
+            new_size = self.size * 2
+        else:
+            new_size = self.size
+        self.size = max(self.min_size, min(self.max_size, new_size))
+    
+    def record_failure(self):
+        """Halve size after a timeout or server error"""
+        self.size = max(self.min_size, self.size // 2)
+
+# Batch sizes learned during this run, by object class
+batch_sizers: Dict[str, BatchSizer] = {}
+
+def get_batch_sizer(obj_class: str) -> BatchSizer:
+    """Get (or create) the batch sizer for an object class"""
+    if obj_class not in batch_sizers:
+        size, min_size, max_size = settings.batch_size_limits.get(obj_class, settings.default_batch_size_limits)
+        batch_sizers[obj_class] = BatchSizer(size, min_size, max_size)
+    return batch_sizers[obj_class]
+
+def fetch_objects(obj_class: str, obj_ids: List[int],
+                  journal: Optional[ExportJournal] = None,
+                  errors: Optional[ErrorLog] = None, trimmed: bool = True) -> List[dict]:
+    """Fetch multiple objects from Stepik API in adaptively sized batches.
+    
+    Objects are trimmed to object_fields unless trimmed is False (they are
+    not journaled then).
+    Timeouts, 413/414/429 and server errors are retried with smaller
+    batches, max_batch_retries times; other errors and undecodable
+    responses are not retried. Without errors, a failed batch raises
+    RuntimeError. With errors, its ids are set aside, fetched one by one in
+    a final sweep together with ids the API did not return, and those
+    failing again are recorded in errors.
+    """
+    objs = []
+    if not trimmed:
+        journal = None
+    if journal:
+        # Skip objects fetched before the previous run failed
+        objs = journal.get_objects(obj_class, obj_ids)
+        fetched_ids = {obj['id'] for obj in objs}
+        obj_ids = [obj_id for obj_id in obj_ids if obj_id not in fetched_ids]
+    sizer = get_batch_sizer(obj_class)
+    base_url = f'{settings.api_host}/api/{plural(obj_class)}?'
+    i = 0
+    failures = 0
+    set_aside = []
+    cache = get_response_cache()
+    while i < len(obj_ids):
+        # Batches answered before are requested again as they were, to be revalidated
+        count = len(cache.cached_batch(obj_class, obj_ids[i:])) if cache and not failures else 0
+        count = count or sizer.fit(base_url, obj_ids[i:])
+        obj_ids_slice = obj_ids[i:i + count]
+        ids_param = '&'.join(f'ids[]={obj_id}' for obj_id in obj_ids_slice)
+        api_url = base_url + ids_param
+        started = time.monotonic()
+        # Overload and timeouts pass, other errors come back on every retry
+        retry = give_up = False
+        try:
+            status, content, cached = get_content(api_url, obj_class, obj_ids_slice)
+            error = f'HTTP {status}'
+            # 413/414: request too large, 429/5xx: server overloaded
+            if status in (413, 414, 429) or status >= 500:
+                retry = True
+            elif status >= 400:
+                give_up = True
+            else:
+                batch = decode_objects(obj_class, content, trimmed)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            retry = True
+            error = str(e)
+        except (ValueError, KeyError) as e:
+            give_up = True
+            error = f'bad response: {e!r}'
+        if retry:
+            failures += 1
+            if failures <= settings.max_batch_retries:
+                sizer.record_failure()
+                time.sleep(min(2 ** failures, 30) / 4)
+                continue
+            give_up = True
+        if give_up:
+            if errors is None:
+                raise RuntimeError(f'Unable to fetch {plural(obj_class)} {obj_ids_slice}: {error}')
+            set_aside += obj_ids_slice
+            i += count
+            failures = 0
+            continue
+        failures = 0
+        if not cached:
+            # A 304 says nothing about the time and size of a full response
+            sizer.record(count, time.monotonic() - started, len(content))
+        if batch_log is not None:
+            batch_log.append((time.monotonic() - started, obj_class, count, 0 if cached else len(content)))
+        if journal:
+            journal.record_batch(obj_class, batch)
+        objs += batch
+        i += count
+    
+    if errors is not None:
+        returned_ids = {obj['id'] for obj in objs}
+        for obj_id in set_aside + [obj_id for obj_id in obj_ids
+                                   if obj_id not in returned_ids and obj_id not in set_aside]:
+            try:
+                found = fetch_objects(obj_class, [obj_id], journal, trimmed=trimmed)
+            except (RuntimeError, requests.RequestException) as e:
+                errors.add(obj_class, obj_id, str(e))
+                continue
+            if found:
+                objs += found
+            else:
+                errors.add(obj_class, obj_id, 'not returned by API')
+    return objs
+
+def fetch_progresses(objs: List[dict], journal: Optional[ExportJournal] = None) -> Dict[str, dict]:
+    """Progress objects of course, section, unit or step objects, by progress id.
+    
+    Progress is not part of the course content: if it cannot be fetched,
+    a warning is printed and the export goes on without it.
+    """
+    progress_ids = list(dict.fromkeys(obj['progress'] for obj in objs if obj.get('progress')))
+    try:
+        return {progress['id']: progress for progress in fetch_objects('progress', progress_ids, journal)}
+    except (RuntimeError, requests.RequestException) as e:
+        print(f"Warning: progress not fetched: {e}")
+        return {}
+
+class RateLimiter:
+    """Spaces out request starts shared by several threads"""
+    
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.next_at = 0.0
+        self.lock = threading.Lock()
+    
+    def wait(self):
+        """Block until the next request may start"""
+        with self.lock:
+            now = time.monotonic()
+            start_at = max(now, self.next_at)
+            self.next_at = start_at + self.interval
+        time.sleep(start_at - now)
+
+def update_object(obj_class: str, obj_id: int, data: dict,
+                  limiter: Optional[RateLimiter] = None) -> dict:
+    """Update object with PUT, retrying when the server is overloaded"""
+    api_url = f'{settings.api_host}/api/{plural(obj_class)}/{obj_id}'
+    failures = 0
+    while True:
+        if limiter:
+            limiter.wait()
+        try:
+            response = session.put(api_url, json=data,
+                                   headers=auth_headers(),
+                                   timeout=settings.request_timeout)
+            failed = response.status_code == 429 or response.status_code >= 500
+            error = f'HTTP {response.status_code}'
+            retry_after = response.headers.get('Retry-After', '')
+        except (requests.Timeout, requests.ConnectionError) as e:
+            failed = True
+            error = str(e)
+            retry_after = ''
+        if not failed:
+            response.raise_for_status()
+            return response.json()[plural(obj_class)][0]
+        failures += 1
+        if failures > settings.max_batch_retries:
+            raise RuntimeError(f'Unable to update {obj_class} {obj_id}: {error}')
+        time.sleep(float(retry_after) if retry_after.isdigit() else min(2 ** failures, 30) / 4)
+
+def fetch_course_page(page: int, params: dict) -> dict:
+    """Fetch one page of the course list"""
+    response = session.get(f'{settings.api_host}/api/courses', params={**params, 'page': page},
+                           headers=auth_headers(), timeout=settings.request_timeout)
+    if response.status_code == 404:
+        # Page past the end
+        return {'courses': [], 'meta': {'page': page, 'has_next': False}}
+    response.raise_for_status()
+    return json_loads(response.content)
+
+def discover_courses(params: Optional[dict] = None, workers: int = 4, owner: Optional[int] = None,
+                     created_since: Optional[str] = None,
+                     updated_since: Optional[str] = None) -> Iterator[dict]:
+    """Yield courses of the account as their list pages arrive.
+    
+    The API only tells whether there is a next page, so after the first page
+    up to workers pages ahead are fetched at once until a page says it is
+    the last one. Dates are ISO strings compared with create_date and
+    update_date.
+    """
+    params = {'is_public': 'false', **(params or {})}
+    seen = set()
+    
+    def matching(courses: List[dict]) -> Iterator[dict]:
+        for course in courses:
+            if course['id'] in seen:
+                continue
+            seen.add(course['id'])
+            if owner is not None and course.get('owner') != owner:
+                continue
+            if created_since and (course.get('create_date') or '') < created_since:
+                continue
+            if updated_since and (course.get('update_date') or '') < updated_since:
+                continue
+            yield course
+    
+    first = fetch_course_page(1, params)
+    yield from matching(first['courses'])
+    if not first['meta'].get('has_next'):
+        return
+    
+    last_page = None
+    next_page = 2
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        while True:
+            while len(futures) < workers and (last_page is None or next_page <= last_page):
+                futures[pool.submit(fetch_course_page, next_page, params)] = next_page
+                next_page += 1
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = futures.pop(future)
+                data = future.result()
+                if not data['meta'].get('has_next'):
+                    last_page = page if last_page is None else min(last_page, page)
+                yield from matching(data['courses'])
+
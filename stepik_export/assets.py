@@ -0,0 +1,129 @@
+# Media download into a content-addressed store
+import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from pathlib import Path
+from typing import List, Dict
+
+from . import settings
+from .files import atomic_write
+
+# Media referenced from step HTML (images, embedded video/audio)
+media_src_re = re.compile(r'<(?:img|source|video|audio)\b[^>]*?\bsrc\s*=\s*["\']([^"\']+)["\']', re.I)
+
+def asset_store_path(sha256: str, url: str) -> Path:
+    """Content-addressed location of an asset inside the assets dir"""
+    suffix = Path(urlparse(url).path).suffix.lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,5}', suffix):
+        suffix = ''
+    return Path(sha256[:2]) / f'{sha256}{suffix}'
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file on disk"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def download_asset(url: str, assets_dir: Path) -> dict:
+    """Download one asset, resuming a partial download if there is one"""
+    import requests
+    partial_dir = assets_dir / '.partial'
+    partial_dir.mkdir(parents=True, exist_ok=True)
+    partial_file = partial_dir / hashlib.sha1(url.encode()).hexdigest()
+    
+    # Hash what is already on disk, then ask only for the rest
+    digest = hashlib.sha256()
+    offset = 0
+    if partial_file.exists():
+        with open(partial_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+                offset += len(chunk)
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    
+    with requests.get(url, headers=headers, stream=True, timeout=settings.request_timeout) as response:
+        if response.status_code == 416:
+            # Partial file is already complete (or stale): start over
+            partial_file.unlink()
+            return download_asset(url, assets_dir)
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            # Server ignored Range header
+            digest = hashlib.sha256()
+            offset = 0
+        expected_size = response.headers.get('Content-Length')
+        expected_size = offset + int(expected_size) if expected_size else None
+        with open(partial_file, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(1 << 16):
+                digest.update(chunk)
+                f.write(chunk)
+    
+    size = partial_file.stat().st_size
+    if expected_size is not None and size != expected_size:
+        raise IOError(f'Incomplete download of {url}: {size} of {expected_size} bytes')
+    sha256 = digest.hexdigest()
+    path = asset_store_path(sha256, url)
+    target = assets_dir / path
+    if target.exists():
+        partial_file.unlink()
+    else:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial_file.replace(target)
+    return {'sha256': sha256, 'size': size, 'path': path.as_posix()}
+
+def download_assets(urls: List[str], assets_dir: Path, workers: int = 8) -> Dict[str, str]:
+    """Download assets concurrently into a content-addressed store.
+    
+    Returns map of URL to file path relative to assets_dir. Finished
+    downloads are listed in manifest.json and verified against their
+    checksum instead of being downloaded again.
+    """
+    import requests
+    assets_dir.mkdir(parents=True, exist_ok=True)
+    manifest_file = assets_dir / 'manifest.json'
+    manifest = {}
+    if manifest_file.exists():
+        with open(manifest_file, encoding='utf-8') as f:
+            manifest = json.load(f)
+    
+    def is_valid(entry: dict) -> bool:
+        path = assets_dir / entry['path']
+        return path.exists() and file_sha256(path) == entry['sha256']
+    
+    urls = list(dict.fromkeys(urls))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        valid = dict(zip(urls, pool.map(lambda url: url in manifest and is_valid(manifest[url]), urls)))
+        pending = [url for url in urls if not valid[url]]
+        futures = {url: pool.submit(download_asset, url, assets_dir) for url in pending}
+        for url, future in futures.items():
+            try:
+                manifest[url] = future.result()
+            except (requests.RequestException, IOError) as e:
+                print(f'  Unable to download {url}: {e}')
+                manifest.pop(url, None)
+    
+    # Several distributed workers may share the assets dir
+    with atomic_write(manifest_file) as temp_file, open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return {url: manifest[url]['path'] for url in urls if url in manifest}
+
+def read_asset_paths(course_dir: Path) -> Dict[str, str]:
+    """Local paths of downloaded media used in lesson files, by URL"""
+    manifest_file = course_dir / 'assets' / 'manifest.json'
+    if not manifest_file.exists():
+        return {}
+    with open(manifest_file, encoding='utf-8') as f:
+        manifest = json.load(f)
+    return {url: f'../assets/{entry["path"]}' for url, entry in manifest.items()}
+
+def rewrite_asset_urls(text: str, local_paths: Dict[str, str]) -> str:
+    """Replace remote asset URLs in text with local paths"""
+    if not local_paths:
+        return text
+    pattern = re.compile('|'.join(re.escape(url) for url in sorted(local_paths, key=len, reverse=True)))
+    return pattern.sub(lambda m: local_paths[m.group(0)], text)
+
@@ -0,0 +1,179 @@
+# Content-addressed blob store for snapshot exports (--format blobs)
+import os
+import json
+import time
+import shutil
+import hashlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Set, Tuple, Union
+
+from .assets import file_sha256
+from .files import atomic_write
+from .sinks import OutputSink
+
+# A file of a snapshot is one blob, or a list of blobs to concatenate (lessons, by step)
+FileBlobs = Union[str, List[str]]
+
+class BlobStore:
+    """Files named by the SHA-256 of their content: root/ab/abcdef..."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, key: str) -> Path:
+        """File of blob key"""
+        return self.root / key[:2] / key
+
+    def put(self, data: bytes) -> str:
+        """Store data unless it is stored already; its key"""
+        key = hashlib.sha256(data).hexdigest()
+        if not self._reuse(key):
+            with atomic_write(self.path(key)) as temp_file:
+                temp_file.write_bytes(data)
+        return key
+
+    def put_file(self, source: Path) -> str:
+        """Store a copy of a file from disk; its key"""
+        key = file_sha256(source)
+        if not self._reuse(key):
+            with atomic_write(self.path(key)) as temp_file:
+                shutil.copyfile(source, temp_file)
+        return key
+
+    def _reuse(self, key: str) -> bool:
+        target = self.path(key)
+        if target.exists():
+            # Fresh again for the grace period of collect_garbage
+            os.utime(target)
+            return True
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return False
+
+    def get(self, key: str) -> bytes:
+        """Content of blob key"""
+        return self.path(key).read_bytes()
+
+    def keys(self) -> Set[str]:
+        """Keys of all stored blobs"""
+        return {path.name for path in self.root.glob('??/*') if '.' not in path.name}
+
+def split_at_headers(text: str, headers: List[str]) -> List[str]:
+    """text cut before each of headers (lines outside code blocks, in order); the parts join back to text"""
+    parts = []
+    start = 0
+    in_code = False
+    position = 0
+    for line in text.splitlines(keepends=True):
+        if line.startswith('```'):
+            in_code = not in_code
+        elif not in_code and len(parts) < len(headers) and line.rstrip('\r\n') == headers[len(parts)]:
+            parts.append(text[start:position])
+            start = position
+        position += len(line)
+    parts.append(text[start:])
+    return parts
+
+class BlobSink(OutputSink):
+    """Snapshot of an export: files stored as blobs, listed in snapshots/NAME/TIME.json.
+
+    Lessons are stored by step, and step sources as JSON blobs, so an
+    unchanged step costs nothing in a new snapshot. The manifest is written
+    when the export completes; blobs of an aborted one are left for
+    collect_garbage.
+    """
+
+    def __init__(self, output_dir: Path, name: str):
+        self.store = BlobStore(output_dir / 'blobs')
+        created = datetime.now()
+        # Microseconds: exports of a course started within the same second get snapshots of their own
+        self.manifest_file = output_dir / 'snapshots' / name / f"{created.strftime('%Y%m%d-%H%M%S-%f')}.json"
+        self.manifest = {'created': created.isoformat(timespec='seconds'), 'files': {}, 'sources': []}
+
+    def write_bytes(self, path: str, data: bytes):
+        self.manifest['files'][path] = self.store.put(data)
+
+    def add_file(self, path: str, source: Path):
+        self.manifest['files'][path] = self.store.put_file(source)
+
+    def write_lesson(self, path: str, text: str, step_titles: List[str]):
+        parts = split_at_headers(text, [f'## {title}' for title in step_titles])
+        self.manifest['files'][path] = [self.store.put(part.encode('utf-8')) for part in parts]
+
+    def store_step_source(self, content: dict) -> str:
+        # default: spilled step blocks are mappings, not dicts
+        key = self.store.put(json.dumps(content, sort_keys=True, ensure_ascii=False, default=dict).encode('utf-8'))
+        self.manifest['sources'].append(key)
+        return key
+
+    def location(self, path: str) -> Path:
+        return self.manifest_file / path
+
+    def close(self):
+        self.manifest['sources'] = sorted(set(self.manifest['sources']))
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.manifest_file) as temp_file:
+            temp_file.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=1), encoding='utf-8')
+
+    def abort(self):
+        pass
+
+def snapshot_files(output_dir: Path) -> List[Path]:
+    """Manifests of all snapshots in output_dir, oldest first within each export"""
+    return sorted((output_dir / 'snapshots').glob('*/*.json'))
+
+def restore_snapshot(manifest_file: Path, target_dir: Path) -> int:
+    """Write the files of a snapshot as loose files under target_dir; number of files"""
+    store = BlobStore(manifest_file.parents[2] / 'blobs')
+    with open(manifest_file, encoding='utf-8') as f:
+        files: Dict[str, FileBlobs] = json.load(f)['files']
+    for path, keys in files.items():
+        target = target_dir / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(keys, str):
+            shutil.copyfile(store.path(keys), target)
+        else:
+            target.write_bytes(b''.join(store.get(key) for key in keys))
+    return len(files)
+
+def collect_garbage(output_dir: Path, keep: int = 0, grace: float = 24 * 3600) -> Tuple[int, int, int]:
+    """Delete old snapshots and blobs no snapshot references; (snapshots, blobs, bytes) deleted.
+
+    Only the keep newest snapshots of each export are kept (0: all of them).
+    Blobs used within grace seconds are kept: an export running now may not
+    have written its manifest yet.
+    """
+    deleted_snapshots = 0
+    by_export: Dict[Path, List[Path]] = {}
+    for manifest_file in snapshot_files(output_dir):
+        by_export.setdefault(manifest_file.parent, []).append(manifest_file)
+    if keep:
+        for manifest_files in by_export.values():
+            for manifest_file in manifest_files[:-keep]:
+                manifest_file.unlink()
+                deleted_snapshots += 1
+
+    referenced = set()
+    for manifest_file in snapshot_files(output_dir):
+        with open(manifest_file, encoding='utf-8') as f:
+            manifest = json.load(f)
+        for keys in manifest['files'].values():
+            referenced.update([keys] if isinstance(keys, str) else keys)
+        referenced.update(manifest.get('sources', []))
+
+    store = BlobStore(output_dir / 'blobs')
+    deleted_blobs = deleted_bytes = 0
+    now = time.time()
+    for key in store.keys() - referenced:
+        path = store.path(key)
+        stat = path.stat()
+        if now - stat.st_mtime < grace:
+            continue
+        path.unlink()
+        deleted_blobs += 1
+        deleted_bytes += stat.st_size
+    # Temporary files of writes that were interrupted
+    for temp_file in store.root.glob('??/*.tmp'):
+        if now - temp_file.stat().st_mtime >= grace:
+            temp_file.unlink()
+    return deleted_snapshots, deleted_blobs, deleted_bytes
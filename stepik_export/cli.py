@@ -0,0 +1,432 @@
+# Command line entry point: stepik-export
+import os
+import sys
+import argparse
+import itertools
+import configparser
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from . import settings
+from .selection import CourseSelection
+
+# Everything else (requests, yaml, the model) is imported by the code paths
+# that need it, so that --help and runs without API requests start fast
+
+default_config_file = Path.home() / '.config' / 'stepik-export.ini'
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line"""
+    parser = argparse.ArgumentParser(
+        prog='stepik-export',
+        description='Save Stepik course structure as seen in left menu to YAML and markdown files.',
+        epilog='Credentials are read from STEPIK_CLIENT_ID and STEPIK_CLIENT_SECRET, '
+               f'or from [stepik] client_id/client_secret in the config file ({default_config_file}).')
+    parser.add_argument('course_ids', nargs='*', type=int, metavar='COURSE_ID',
+                        help='courses to export (default: first course of the account)')
+    parser.add_argument('-o', '--output-dir', type=Path, default=Path.cwd() / 'courses',
+                        help='output directory (default: ./courses)')
+    parser.add_argument('-p', '--profile', choices=sorted(settings.export_profiles), default='default',
+                        help='export profile: preset of the options below')
+    parser.add_argument('--config', type=Path, default=default_config_file, help='config file with credentials')
+
+    group = parser.add_argument_group('output')
+    group.add_argument('--format', dest='output_format',
+                       choices=['dir', 'zip', 'tar.gz', 'tar.xz', 'tar.zst', 'sqlite', 'blobs'],
+                       help='output format (default: dir); blobs: snapshots sharing a content-addressed store')
+    group.add_argument('--media', dest='download_media', action='store_true', default=None,
+                       help='download videos and images and link them locally')
+    group.add_argument('--no-media', dest='download_media', action='store_false')
+    group.add_argument('--no-progress', dest='fetch_progress', action='store_false', default=None,
+                       help='do not fetch learner progress for the TOC and left menu')
+    group.add_argument('--stats', dest='stats_formats', nargs='*', choices=['json', 'csv'],
+                       help='course statistics files (none to disable)')
+
+    group = parser.add_argument_group('performance')
+    group.add_argument('-j', '--concurrency', type=int,
+                       help='parallel media downloads and course list pages')
+    group.add_argument('--render-workers', type=int, help='processes rendering markdown (0: none)')
+    group.add_argument('--batch-size', type=int, help='initial number of objects per API request')
+    group.add_argument('--cache-dir', type=Path, help='cache location (default: OUTPUT_DIR/.cache)')
+    group.add_argument('--no-cache', action='store_true',
+                       help='do not keep converted markdown and API responses on disk')
+    group.add_argument('--timeout', type=float, help='API request timeout, seconds')
+    group.add_argument('--memory-budget', type=int, metavar='MB',
+                       help='keep at most MB of step contents in memory, spill the rest to CACHE_DIR')
+
+    group = parser.add_argument_group('course selection')
+    group.add_argument('--all', action='store_true', help='export every course of the account')
+    group.add_argument('--owner', type=int, help='only courses of this user id')
+    group.add_argument('--created-since', metavar='DATE', help='only courses created since DATE (ISO)')
+    group.add_argument('--updated-since', metavar='DATE', help='only courses updated since DATE (ISO)')
+    group.add_argument('--sections', default='', metavar='LIST',
+                       help='export only these sections, e.g. 2,5 or 2-4 (updates files in place)')
+    group.add_argument('--lessons', default='', metavar='LIST',
+                       help='export only these lessons: menu numbers, ranges or ids, e.g. 3.1-3.4,5.2,123456')
+
+    group = parser.add_argument_group('modes')
+    group.add_argument('--watch', action='store_true', help='keep running and re-export changed lessons')
+    group.add_argument('--interval', type=int, help='watch mode: seconds between checks')
+    group.add_argument('--status-port', type=int, help='watch mode: port of the status page')
+    group.add_argument('--deploy', action='store_true',
+                       help='upload steps edited in the exported lesson files back to Stepik')
+    group.add_argument('--dry-run', action='store_true', help='deploy: only show what would be uploaded')
+    group.add_argument('--profile-run', action='store_true',
+                       help='profile the run: stage times, slowest API batches and '
+                            'OUTPUT_DIR/profile.collapsed for flame graphs')
+    group.add_argument('--menu', action='store_true',
+                       help='only print left menus of courses already in OUTPUT_DIR (no API requests)')
+    group.add_argument('--check-links', action='store_true',
+                       help='only check links and media URLs of courses already in OUTPUT_DIR, '
+                            'writing links_ID.json next to each TOC')
+    group.add_argument('--site', type=Path, metavar='SITE_DIR',
+                       help='only build a static HTML site of courses already in OUTPUT_DIR '
+                            '(pages whose lesson or menu did not change are not rebuilt)')
+    group.add_argument('--gc', action='store_true',
+                       help='only delete blobs of OUTPUT_DIR no snapshot uses (after old snapshots with --keep)')
+    group.add_argument('--keep', type=int, default=0, metavar='N', help='gc: keep N newest snapshots of each course')
+    group.add_argument('--restore', type=Path, metavar='SNAPSHOT',
+                       help='only write the files of a snapshot (snapshots/.../TIME.json) to OUTPUT_DIR')
+    group.add_argument('--catalogue-stats', action='store_true',
+                       help='only aggregate statistics of courses already in OUTPUT_DIR')
+
+    group = parser.add_argument_group('distributed export (output dir shared by the nodes)')
+    group.add_argument('--queue', metavar='LOCATION',
+                       help='work queue: path of an SQLite file on shared storage, or BACKEND://PATH')
+    group.add_argument('--enqueue', action='store_true',
+                       help='coordinator: queue export jobs for the courses, large courses by section')
+    group.add_argument('--worker', action='store_true', help='run queued jobs until none are left')
+    return parser.parse_args(argv)
+
+def apply_settings(args: argparse.Namespace):
+    """Apply export profile, then explicit options, to settings"""
+    for name, value in settings.export_profiles[args.profile].items():
+        setattr(settings, name, value)
+    for name in ('output_format', 'download_media', 'fetch_progress', 'render_workers'):
+        if getattr(args, name) is not None:
+            setattr(settings, name, getattr(args, name))
+    if args.stats_formats is not None:
+        settings.stats_formats = tuple(args.stats_formats)
+    if args.concurrency is not None:
+        settings.media_workers = settings.discovery_workers = args.concurrency
+    if args.batch_size is not None:
+        settings.batch_size_limits = {
+            obj_class: (args.batch_size, min(min_size, args.batch_size), max(max_size, args.batch_size))
+            for obj_class, (_, min_size, max_size) in settings.batch_size_limits.items()}
+        _, min_size, max_size = settings.default_batch_size_limits
+        settings.default_batch_size_limits = (args.batch_size, min(min_size, args.batch_size),
+                                              max(max_size, args.batch_size))
+    if args.timeout is not None:
+        settings.request_timeout = args.timeout
+    if args.memory_budget is not None:
+        settings.memory_budget = args.memory_budget
+    if args.interval is not None:
+        settings.watch_interval = args.interval
+    if args.status_port is not None:
+        settings.status_port = args.status_port
+    settings.cache_dir = args.cache_dir or args.output_dir / '.cache'
+    settings.markdown_cache_dir = None if args.no_cache else settings.cache_dir / 'markdown'
+    settings.response_cache_file = None if args.no_cache else settings.cache_dir / 'responses.sqlite'
+
+def read_credentials(config_file: Path) -> Tuple[str, str]:
+    """Client id and secret from environment, or else from config file"""
+    config = configparser.ConfigParser()
+    config.read(config_file, encoding='utf-8')
+    section = config['stepik'] if config.has_section('stepik') else {}
+    settings.api_host = section.get('api_host', settings.api_host)
+    return (os.environ.get('STEPIK_CLIENT_ID') or section.get('client_id', ''),
+            os.environ.get('STEPIK_CLIENT_SECRET') or section.get('client_secret', ''))
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Main function"""
+    args = parse_args(argv)
+    apply_settings(args)
+    if args.profile_run:
+        from .profiler import profiled
+        with profiled(args.output_dir / 'profile.collapsed'):
+            result = run(args)
+    else:
+        result = run(args)
+    if 'stepik_export.api' in sys.modules:
+        from .api import transfer_stats
+        if transfer_stats['requests']:
+            print(f"\nAPI requests: {transfer_stats['requests']} ({transfer_stats['not_modified']} not modified), "
+                  f"{transfer_stats['bytes'] / 1e6:.2f} MB received")
+    from .spill import peak_memory_mb
+    peak = peak_memory_mb()
+    if peak is not None:
+        print(f"\nPeak memory: {peak:.0f} MB")
+    return result
+
+def run(args: argparse.Namespace) -> int:
+    """Export, deploy or watch courses as the command line says"""
+    try:
+        selection = CourseSelection.parse(args.sections, args.lessons)
+    except ValueError as e:
+        print(e)
+        return 2
+    if not (selection.sections or selection.lesson_ranges or selection.lesson_ids):
+        selection = None
+    output_dir = args.output_dir
+    print("Course Structure Saver")
+    print("=" * 50)
+
+    if args.catalogue_stats:
+        from .stats import catalogue_stats, stats_to_json, catalogue_stats_to_csv
+        catalogue = catalogue_stats(output_dir)
+        (output_dir / 'catalogue_stats.json').write_text(stats_to_json(catalogue), encoding='utf-8')
+        (output_dir / 'catalogue_stats.csv').write_text(catalogue_stats_to_csv(catalogue), encoding='utf-8')
+        print(f"{len(catalogue['courses'])} courses, {catalogue['lessons']} lessons, {catalogue['steps']} steps")
+        print(f"Statistics saved to {output_dir / 'catalogue_stats.json'}")
+        return 0
+
+    if args.menu:
+        return print_menus(args.course_ids, output_dir)
+    if args.site:
+        toc_files = exported_tocs(args.course_ids, output_dir)
+        if not toc_files:
+            print(f"No exported courses in {output_dir}")
+            return 1
+        from .site import build_site
+        rendered, removed = build_site(toc_files, args.site)
+        print(f"Site {args.site / 'index.html'}: {rendered} pages rendered, {removed} removed")
+        return 0
+    if args.gc:
+        from .blobstore import collect_garbage
+        snapshots, blobs, num_bytes = collect_garbage(output_dir, args.keep)
+        print(f"Deleted {snapshots} snapshots, {blobs} blobs ({num_bytes / 1e6:.1f} MB)")
+        return 0
+    if args.restore:
+        from .blobstore import restore_snapshot
+        print(f"Restored {restore_snapshot(args.restore, output_dir)} files to {output_dir}")
+        return 0
+    if args.check_links:
+        toc_files = exported_tocs(args.course_ids, output_dir)
+        if not toc_files:
+            print(f"No exported courses in {output_dir}")
+            return 1
+        from .linkcheck import check_links
+        return 1 if check_links(toc_files) else 0
+
+    if args.queue and not (args.enqueue or args.worker):
+        print('--queue needs --enqueue or --worker')
+        return 2
+    if args.queue and settings.output_format != 'dir':
+        print('Distributed export writes to a directory only (--format dir)')
+        return 2
+    if args.watch and settings.output_format != 'dir':
+        print('Watch mode writes to a directory only (--format dir)')
+        return 2
+
+    client_id, client_secret = read_credentials(args.config)
+    if not (client_id and client_secret):
+        print('No credentials: set STEPIK_CLIENT_ID and STEPIK_CLIENT_SECRET '
+              f'or put them in {args.config}')
+        return 1
+    from . import api
+    # Token is requested with the first API request (runs resumed from a
+    # complete checkpoint make none)
+    api.set_credentials(client_id, client_secret)
+
+    if args.course_ids:
+        courses = ({'id': course_id, 'title': f'course {course_id}'} for course_id in args.course_ids)
+    elif args.queue and not args.enqueue:
+        # Workers take their courses from the queue
+        courses = iter(())
+    else:
+        print("Fetching courses from your account...")
+        courses = api.discover_courses(workers=settings.discovery_workers, owner=args.owner,
+                                   created_since=args.created_since,
+                                   updated_since=args.updated_since)
+        if not args.all:
+            courses = itertools.islice(courses, 1)
+
+    if args.queue:
+        from . import distributed
+        from .workqueue import open_queue
+        queue = open_queue(args.queue)
+        try:
+            if args.enqueue:
+                if not distributed.enqueue_courses(queue, courses, output_dir):
+                    print("No courses found. Please check your credentials.")
+                    return 1
+                print(f"Jobs: {queue.counts()}")
+            if args.worker:
+                return 1 if distributed.run_worker(queue, output_dir) else 0
+        except api.AuthorizationError as e:
+            print(e)
+            return 1
+        return 0
+
+    # Courses are exported while the rest of the list is still being fetched
+    found = 0
+    failed = 0
+    try:
+        for course_info in courses:
+            found += 1
+            course_id = course_info['id']
+            print(f"\nUsing course: {course_info['title']} (ID: {course_id})")
+            if args.watch:
+                from .watch import watch
+                watch(course_id, output_dir, settings.watch_interval)
+                return 0
+            if args.deploy:
+                from .deploy import deploy
+                failed += not deploy(course_id, output_dir, args.dry_run)
+                continue
+            failed += not export_course(course_id, output_dir, selection)
+    except api.AuthorizationError as e:
+        print(e)
+        return 1
+
+    if not found:
+        print("No courses found. Please check your credentials.")
+        return 1
+    return 1 if failed else 0
+
+def exported_tocs(course_ids: List[int], output_dir: Path) -> List[Path]:
+    """TOC files of exported courses (all in output_dir if no course_ids)"""
+    if course_ids:
+        return [toc_file for course_id in course_ids
+                for toc_file in sorted(output_dir.glob(f'*/toc_{course_id}.yaml'))]
+    return sorted(output_dir.glob('*/toc_*.yaml'))
+
+def print_menus(course_ids: List[int], output_dir: Path) -> int:
+    """Print left menus of exported courses (all in output_dir if no course_ids)"""
+    from .models import Course
+    toc_files = exported_tocs(course_ids, output_dir)
+    if not toc_files:
+        print(f"No exported courses in {output_dir}")
+        return 1
+    for toc_file in toc_files:
+        print(f"\n{Course.from_toc(toc_file).get_left_menu_text()}")
+    return 0
+
+def move_kept_lessons(course_dir: Path, exported: 'Course', course: 'Course', only_lessons: set):
+    """Move files of lessons kept from the exported course whose section was renamed or renumbered"""
+    old_files = exported.lesson_files()
+    new_files = course.lesson_files()
+    old_lessons = {l.lesson_id: l for s in exported.sections for l in s.lessons}
+    moves = []
+    for lesson in (l for s in course.sections for l in s.lessons):
+        old_path = old_files.get(lesson.lesson_id)
+        if lesson.lesson_id in only_lessons or old_path in (None, new_files[lesson.lesson_id]):
+            continue
+        source = course_dir / old_path
+        if source.exists():
+            # Via a temporary name: the target may be the old path of another moved lesson
+            temp_file = source.with_name(f'{source.name}.moving')
+            source.rename(temp_file)
+            moves.append((old_lessons[lesson.lesson_id], lesson, temp_file, course_dir / new_files[lesson.lesson_id]))
+    for old_lesson, lesson, temp_file, target in moves:
+        text = temp_file.read_text(encoding='utf-8')
+        # Header carries the menu number
+        old_header = f'# {old_lesson.menu_number} {old_lesson.title}\n'
+        if text.startswith(old_header):
+            text = f'# {lesson.menu_number} {lesson.title}\n' + text[len(old_header):]
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(text, encoding='utf-8')
+        temp_file.unlink()
+
+def export_course(course_id: int, output_dir: Path, selection: Optional[CourseSelection] = None) -> bool:
+    """Export one course, resuming from its checkpoint if there is one.
+    
+    With selection, only the selected part is fetched; if the course was
+    exported to output_dir before, its files and TOC are updated in place.
+    Objects that fail are left out and listed in errors_{id}.json next to
+    the TOC; the export then counts as failed.
+    """
+    from .api import AuthorizationError
+    from .errors import ErrorLog
+    from .journal import ExportJournal
+    from .models import Course, course_dir_name
+    from .sinks import open_sink
+    from .spill import PayloadStore
+    from .stats import course_stats
+    
+    errors = ErrorLog()
+    payloads = None
+    if settings.memory_budget is not None:
+        payloads = PayloadStore(settings.memory_budget << 20, settings.cache_dir)
+    journal = ExportJournal(output_dir / '.checkpoints' / f'course_{course_id}.jsonl', payloads)
+    if journal.resumed:
+        print("Resuming previous export from checkpoint...")
+
+    try:
+        # Fetch course structure
+        print("\nFetching course structure...")
+        course = Course.from_api(course_id, journal, selection=selection, errors=errors, payloads=payloads)
+        if payloads and payloads.spilled:
+            print(f"Step contents: {payloads.in_memory / 1e6:.1f} MB in memory, "
+                  f"{payloads.spilled / 1e6:.1f} MB spilled to {payloads.path}")
+        only_lessons = None
+        stale_files = set()
+        if selection:
+            only_lessons = {l.lesson_id for s in course.sections for l in s.lessons}
+            print(f"Selected {len(course.sections)} sections, {len(only_lessons)} lessons")
+            course_dir = output_dir / course_dir_name(course)
+            toc_file = course_dir / f'toc_{course_id}.yaml'
+            if settings.output_format == 'dir' and toc_file.exists():
+                exported = Course.from_toc(toc_file)
+                course = exported.merge_selection(course, selection)
+                # Before saving: a selected lesson may take the old path of a kept one
+                move_kept_lessons(course_dir, exported, course, only_lessons)
+                stale_files = set(exported.lesson_files().values()) - set(course.lesson_files().values())
+            else:
+                print("No previous export to update, saving only the selected part")
+
+        # Save to files
+        stats = course_stats(course)
+        with open_sink(output_dir, settings.output_format, f'course_{course_id}') as sink:
+            toc_file = course.save_structure(output_dir, settings.download_media, journal, only_lessons,
+                                             sink=sink, with_stats=selection is None, stats=stats)
+            errors_name = f'{course_dir_name(course)}/errors_{course_id}.json'
+            if errors:
+                sink.write_text(errors_name, errors.to_json(course_id))
+            elif settings.output_format == 'dir':
+                # Report of a previous run
+                (output_dir / errors_name).unlink(missing_ok=True)
+        for path in stale_files:
+            (toc_file.parent / path).unlink(missing_ok=True)
+        # Directories of sections that were renamed or removed
+        for section_dir in {(toc_file.parent / path).parent for path in stale_files}:
+            if section_dir.is_dir() and not any(section_dir.iterdir()):
+                section_dir.rmdir()
+        if errors:
+            # Next run fetches the failed objects again and reuses the rest
+            journal.close()
+        else:
+            journal.finish()
+
+        print(f"\nCourse structure saved successfully!")
+        print(f"TOC file: {toc_file}")
+        print(f"Course directory: {toc_file.parent}")
+
+        print(f"Total: {len(course.sections)} sections, {stats['lessons']} lessons, {stats['steps']} steps "
+              f"({stats['code_steps']} code, {stats['videos']} video)")
+
+        # Print left menu preview
+        print("\nLeft menu structure:")
+        print("-" * 50)
+        print(course.get_left_menu_text())
+        
+        if errors:
+            print(f"\n{len(errors)} objects could not be exported, see {toc_file.parent / f'errors_{course_id}.json'}:")
+            for error in errors.errors[:10]:
+                print(f"  {error}")
+            print(f"Run again to retry them; progress is saved in {journal.path}")
+            return False
+        return True
+
+    except AuthorizationError:
+        raise
+    except Exception as e:
+        print(f"Error: {e}")
+        print(f"Progress is saved in {journal.path}, run again to resume.")
+        return False
+    finally:
+        if payloads:
+            payloads.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
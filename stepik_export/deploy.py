@@ -0,0 +1,203 @@
+# Deploy: upload edited lesson Markdown back to the step sources of a course
+import re
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+import requests
+
+from . import api, settings
+from .assets import read_asset_paths, rewrite_asset_urls
+from .html_markdown import html_to_markdown
+from .markdown_html import markdown_to_html
+from .models import Course, Step, content_digest, split_steps, yaml_loader
+
+code_template_re = re.compile(r'\n*```[^\n]*\n# Write your code here\n```$')
+# Downloaded media, as linked from lesson files
+local_asset_re = re.compile(r'\.\./assets/[^)\s"\']+')
+option_re = re.compile(r'^\d+\. (.*)$', re.M)
+
+@dataclass
+class StepUpdate:
+    """Step whose Markdown was edited, with the step source to upload"""
+    menu_number: str
+    step: Step
+    old_markdown: str
+    new_markdown: str
+    step_source: dict
+
+    def __str__(self) -> str:
+        return f'{self.menu_number} {self.step.title} (step {self.step.step_id})'
+
+def find_toc(course_id: int, output_dir: Path) -> Optional[Path]:
+    """TOC of an exported course in output_dir"""
+    return next(iter(sorted(output_dir.glob(f'*/toc_{course_id}.yaml'))), None)
+
+def step_markdown(step: Step) -> str:
+    """Markdown of step as exported, without its header"""
+    return step.to_markdown().partition('\n')[2].strip()
+
+def edited_text(html: str, markdown: str) -> str:
+    """HTML for edited markdown, or html itself if it still converts to markdown"""
+    return html if html_to_markdown(html) == markdown.strip() else markdown_to_html(markdown)
+
+def edited_block(step: Step, markdown: str) -> Optional[dict]:
+    """Step block with text (and choice options) taken from edited Markdown.
+
+    None if this kind of step cannot be edited in Markdown.
+    """
+    block = dict(step.content)
+    if step.step_type == 'text':
+        block['text'] = edited_text(block.get('text', ''), markdown)
+    elif step.step_type == 'code':
+        if not code_template_re.search(markdown):
+            return None
+        block['text'] = edited_text(block.get('text', ''), code_template_re.sub('', markdown))
+    elif step.step_type == 'choice':
+        text, _, options_markdown = markdown.partition('\nOptions:')
+        option_texts = option_re.findall(options_markdown)
+        options = block.get('options') or []
+        if len(option_texts) != len(options):
+            return None
+        block['text'] = edited_text(block.get('text', ''), text)
+        block['options'] = [dict(option, text=edited_text(option.get('text', ''), option_text))
+                            for option, option_text in zip(options, option_texts)]
+        source = block.get('source') or {}
+        if len(source.get('options') or []) == len(options):
+            # The editor keeps its own copy of the options
+            block['source'] = dict(source, options=[dict(source_option, text=option['text'])
+                                                    for source_option, option
+                                                    in zip(source['options'], block['options'])])
+    else:
+        return None
+    return block
+
+def content_hash(step: Step, step_source: dict) -> str:
+    """Hash of step with content from step_source, as the export computes it"""
+    return replace(step, content=api.trim_object('step-source', step_source)['block']).update_hash()
+
+def plan_deploy(toc_file: Path) -> Tuple[List[StepUpdate], List[str]]:
+    """Steps edited in the lesson files of an exported course, and problems found.
+
+    Steps are compared with the live course: unchanged steps are not
+    uploaded, and steps changed on Stepik since the export are not
+    overwritten. Steps whose text is as exported (by the Markdown hash in
+    the TOC) are not edited, whatever changed on Stepik.
+    """
+    course = Course.from_toc(toc_file)
+    course_dir = toc_file.parent
+    lesson_files = course.lesson_files()
+    local_paths = read_asset_paths(course_dir)
+    remote_urls = {}
+    for url, path in local_paths.items():
+        remote_urls.setdefault(path, url)
+
+    step_ids = [step.step_id for section in course.sections for lesson in section.lessons for step in lesson.steps]
+    # Full step sources: they are sent back with the edited block
+    step_sources = {source['id']: source
+                    for source in api.fetch_objects('step-source', step_ids, trimmed=False)}
+
+    updates = []
+    problems = []
+    for section in course.sections:
+        for lesson in section.lessons:
+            lesson_file = course_dir / lesson_files[lesson.lesson_id]
+            if not lesson_file.exists():
+                problems.append(f'{lesson.menu_number} {lesson.title}: no file {lesson_file}')
+                continue
+            bodies = split_steps(lesson_file.read_text(encoding='utf-8'), lesson)
+            if bodies is None:
+                problems.append(f'{lesson.menu_number} {lesson.title}: step headers do not match the TOC')
+                continue
+            for step, markdown in zip(lesson.steps, bodies):
+                if step.markdown_hash == content_digest(markdown):
+                    continue
+                source = step_sources.get(step.step_id)
+                if source is None:
+                    problems.append(f'{lesson.menu_number} {step.title}: step was deleted on Stepik')
+                    continue
+                live_step = replace(step, content=source['block'])
+                old_markdown = rewrite_asset_urls(step_markdown(live_step), local_paths)
+                if markdown == old_markdown:
+                    continue
+                if content_hash(step, source) != step.content_hash:
+                    problems.append(f'{lesson.menu_number} {step.title}: changed on Stepik since export, '
+                                    'export again and redo the edit')
+                    continue
+                new_markdown = rewrite_asset_urls(markdown, remote_urls)
+                unmapped = local_asset_re.findall(new_markdown)
+                if unmapped:
+                    problems.append(f'{lesson.menu_number} {step.title}: media {unmapped[0]} '
+                                    'is not in assets/manifest.json')
+                    continue
+                block = edited_block(live_step, new_markdown)
+                if block is None:
+                    problems.append(f'{lesson.menu_number} {step.title}: '
+                                    f'this {step.step_type} step cannot be edited in Markdown')
+                    continue
+                updates.append(StepUpdate(lesson.menu_number, step, old_markdown, markdown,
+                                          dict(source, block=block)))
+    return updates, problems
+
+def update_toc_hashes(toc_file: Path, step_hashes: Dict[int, str], markdown_hashes: Dict[int, str]):
+    """Record hashes of uploaded steps in TOC, so the next deploy takes them for neither remote changes nor edits"""
+    with open(toc_file, encoding='utf-8') as f:
+        toc = yaml.load(f, Loader=yaml_loader)
+    for section_toc in toc['course']['sections']:
+        for lesson_toc in section_toc['lessons']:
+            for step_toc in lesson_toc['steps']:
+                if step_toc['id'] in step_hashes:
+                    step_toc['hash'] = step_hashes[step_toc['id']]
+                    step_toc['markdown'] = markdown_hashes[step_toc['id']]
+    toc_file.write_text(yaml.dump(toc, allow_unicode=True, sort_keys=False), encoding='utf-8')
+
+def deploy(course_id: int, output_dir: Path, dry_run: bool = False) -> bool:
+    """Upload steps edited in the exported lesson files of a course"""
+    toc_file = find_toc(course_id, output_dir)
+    if toc_file is None:
+        print(f"No export of course {course_id} in {output_dir}")
+        return False
+
+    print("\nComparing lesson files with the course on Stepik...")
+    updates, problems = plan_deploy(toc_file)
+    for problem in problems:
+        print(f"  Skipped {problem}")
+    if not updates:
+        print("No edited steps to deploy")
+        return not problems
+
+    for update in updates:
+        print(f"  {update}")
+        if dry_run:
+            diff = difflib.unified_diff(update.old_markdown.split('\n'), update.new_markdown.split('\n'),
+                                        'stepik', 'local', lineterm='')
+            for line in list(diff)[2:]:
+                print(f"    {line}")
+    if dry_run:
+        print(f"\nDry run: {len(updates)} steps would be updated")
+        return True
+
+    limiter = api.RateLimiter(settings.deploy_requests_per_second)
+    step_hashes = {}
+    markdown_hashes = {}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=settings.deploy_workers) as pool:
+        futures = [(update, pool.submit(api.update_object, 'step-source', update.step.step_id,
+                                        {'stepSource': update.step_source}, limiter))
+                   for update in updates]
+        for update, future in futures:
+            try:
+                source = future.result()
+            except (requests.RequestException, RuntimeError) as e:
+                print(f"  Unable to update {update}: {e}")
+                failed += 1
+                continue
+            step_hashes[update.step.step_id] = content_hash(update.step, source)
+            markdown_hashes[update.step.step_id] = content_digest(update.new_markdown)
+    update_toc_hashes(toc_file, step_hashes, markdown_hashes)
+
+    print(f"\n{len(step_hashes)} steps updated, {failed} failed")
+    return not failed
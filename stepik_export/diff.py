@@ -0,0 +1,132 @@
+# Structural diff of two versions of a course
+from dataclasses import dataclass
+from typing import List
+
+from .models import Course, Lesson, Step
+
+@dataclass
+class CourseChange:
+    """One difference between two versions of a course"""
+    kind: str        # added, removed, moved, renumbered, changed
+    node: str        # course, section, lesson, step
+    node_id: int
+    old: str = ''    # place in old version (menu number), empty if added
+    new: str = ''    # place in new version, empty if removed
+    detail: str = ''
+    
+    def __str__(self) -> str:
+        place = ' -> '.join(p for p in dict.fromkeys((self.old, self.new)) if p)
+        text = f'{self.kind:<10} {self.node} {self.node_id}' + (f' ({place})' if place else '')
+        return f'{text}: {self.detail}' if self.detail else text
+
+def diff_courses(old: 'Course', new: 'Course') -> List[CourseChange]:
+    """Compare two versions of a course by section, lesson and step ids.
+    
+    Uses the content hashes set by from_api/from_toc (call update_hashes
+    after editing a tree). Subtrees with equal hashes are skipped without
+    looking inside, so the cost depends on the size of the change, not of
+    the course.
+    """
+    changes = []
+    if old.content_hash == new.content_hash:
+        return changes
+    
+    if old.title != new.title:
+        changes.append(CourseChange('changed', 'course', new.course_id,
+                                    detail=f'title: {old.title!r} -> {new.title!r}'))
+    
+    # Sections
+    old_sections = {s.section_id: s for s in old.sections}
+    new_sections = {s.section_id: s for s in new.sections}
+    changed_old, changed_new = [], []
+    for section_id, section in old_sections.items():
+        if section_id not in new_sections:
+            changes.append(CourseChange('removed', 'section', section_id, old=str(section.position),
+                                        detail=section.title))
+            changed_old.append(section)
+    for section_id, section in new_sections.items():
+        old_section = old_sections.get(section_id)
+        if old_section is None:
+            changes.append(CourseChange('added', 'section', section_id, new=str(section.position),
+                                        detail=section.title))
+            changed_new.append(section)
+            continue
+        if old_section.position != section.position:
+            changes.append(CourseChange('renumbered', 'section', section_id,
+                                        str(old_section.position), str(section.position)))
+        if old_section.title != section.title:
+            changes.append(CourseChange('changed', 'section', section_id, str(old_section.position),
+                                        str(section.position), f'title: {old_section.title!r} -> {section.title!r}'))
+        if old_section.content_hash != section.content_hash:
+            changed_old.append(old_section)
+            changed_new.append(section)
+    
+    # Lessons of changed sections only; a lesson moved between sections changes both
+    old_lessons = {l.lesson_id: l for s in changed_old for l in s.lessons}
+    new_lessons = {l.lesson_id: l for s in changed_new for l in s.lessons}
+    renumbered_sections = {s.section_id for s in changed_new
+                           if s.section_id in old_sections and old_sections[s.section_id].position != s.position}
+    old_lesson_section = {l.lesson_id: s.section_id for s in changed_old for l in s.lessons}
+    new_lesson_section = {l.lesson_id: s.section_id for s in changed_new for l in s.lessons}
+    changed_lessons = []
+    for lesson_id, lesson in old_lessons.items():
+        if lesson_id not in new_lessons:
+            changes.append(CourseChange('removed', 'lesson', lesson_id, old=lesson.menu_number,
+                                        detail=lesson.title))
+    for lesson_id, lesson in new_lessons.items():
+        old_lesson = old_lessons.get(lesson_id)
+        if old_lesson is None:
+            changes.append(CourseChange('added', 'lesson', lesson_id, new=lesson.menu_number,
+                                        detail=lesson.title))
+            continue
+        if old_lesson_section[lesson_id] != new_lesson_section[lesson_id]:
+            changes.append(CourseChange('moved', 'lesson', lesson_id, old_lesson.menu_number,
+                                        lesson.menu_number))
+        elif (old_lesson.lesson_position != lesson.lesson_position
+              and new_lesson_section[lesson_id] not in renumbered_sections):
+            changes.append(CourseChange('renumbered', 'lesson', lesson_id, old_lesson.menu_number,
+                                        lesson.menu_number))
+        if old_lesson.title != lesson.title:
+            changes.append(CourseChange('changed', 'lesson', lesson_id, old_lesson.menu_number,
+                                        lesson.menu_number, f'title: {old_lesson.title!r} -> {lesson.title!r}'))
+        if old_lesson.content_hash != lesson.content_hash:
+            changed_lessons.append((old_lesson, lesson))
+    
+    # Steps of changed lessons (including steps moved between them)
+    old_steps = {}
+    new_steps = {}
+    for old_lesson, lesson in changed_lessons:
+        old_steps.update((s.step_id, (old_lesson, s)) for s in old_lesson.steps)
+        new_steps.update((s.step_id, (lesson, s)) for s in lesson.steps)
+    for lesson_id, lesson in old_lessons.items():
+        if lesson_id not in new_lessons:
+            old_steps.update((s.step_id, (lesson, s)) for s in lesson.steps)
+    for lesson_id, lesson in new_lessons.items():
+        if lesson_id not in old_lessons:
+            new_steps.update((s.step_id, (lesson, s)) for s in lesson.steps)
+    
+    def place(lesson: Lesson, step: Step) -> str:
+        return f'{lesson.menu_number} step {step.position}'
+    
+    for step_id, (lesson, step) in old_steps.items():
+        if step_id not in new_steps and lesson.lesson_id in new_lessons:
+            changes.append(CourseChange('removed', 'step', step_id, old=place(lesson, step),
+                                        detail=step.step_type))
+    for step_id, (lesson, step) in new_steps.items():
+        if step_id not in old_steps:
+            if lesson.lesson_id in old_lessons:
+                changes.append(CourseChange('added', 'step', step_id, new=place(lesson, step),
+                                            detail=step.step_type))
+            continue
+        old_lesson, old_step = old_steps[step_id]
+        if old_lesson.lesson_id != lesson.lesson_id:
+            changes.append(CourseChange('moved', 'step', step_id, place(old_lesson, old_step),
+                                        place(lesson, step)))
+        elif old_step.position != step.position:
+            changes.append(CourseChange('renumbered', 'step', step_id, place(old_lesson, old_step),
+                                        place(lesson, step)))
+        if old_step.content_hash != step.content_hash:
+            changes.append(CourseChange('changed', 'step', step_id, place(old_lesson, old_step),
+                                        place(lesson, step), 'content'))
+    return changes
+
@@ -0,0 +1,171 @@
+# Distributed export: a coordinator queues jobs, workers on several nodes run them
+import os
+import time
+import shutil
+import socket
+import threading
+from dataclasses import replace
+from pathlib import Path
+from typing import Iterable
+
+from . import api, settings
+from .errors import ErrorLog
+from .models import Course
+from .selection import CourseSelection
+from .stats import merge_course_stats
+from .workqueue import Job, WorkQueue
+
+def enqueue_courses(queue: WorkQueue, courses: Iterable[dict], output_dir: Path) -> int:
+    """Queue export jobs for courses; courses with many sections get a job per section"""
+    count = 0
+    for course_data in courses:
+        course_id = course_data['id']
+        if 'sections' not in course_data:
+            course_data = api.fetch_object('course', course_id)
+        # Sections exported by an earlier run that did not get merged
+        for part in output_dir.glob(f'*/.parts/*_{course_id}_*'):
+            part.unlink()
+        positions = []
+        if len(course_data['sections']) >= settings.queue_split_sections:
+            positions = sorted(section['position'] for section in api.fetch_objects('section', course_data['sections']))
+        queue.put_course(course_id, positions)
+        print(f"Queued course {course_id}" + (f" as {len(positions)} section jobs" if positions else ''))
+        count += 1
+    return count
+
+def export_section(course_id: int, position: int, output_dir: Path) -> bool:
+    """Export lessons of one section, with TOC, statistics and errors of the section in .parts/.
+
+    True once saved: objects that could not be exported do not fail the
+    job, the merge reports them for the course.
+    """
+    errors = ErrorLog()
+    course = Course.from_api(course_id, selection=CourseSelection(sections={position}), errors=errors)
+    toc_file = course.save_structure(output_dir, settings.download_media, fragment=position)
+    errors_file = toc_file.parent / f'errors_{course_id}_{position}.json'
+    if errors:
+        errors_file.write_text(errors.to_json(course_id), encoding='utf-8')
+        print(f"{len(errors)} objects could not be exported, see {errors_file}")
+    else:
+        errors_file.unlink(missing_ok=True)
+    return True
+
+def merge_sections(course_id: int, output_dir: Path) -> bool:
+    """Assemble TOC, left menu, statistics and errors report of a course exported by sections (True once done)"""
+    import json
+    toc_parts = sorted(output_dir.glob(f'*/.parts/toc_{course_id}_*.yaml'))
+    if not toc_parts:
+        raise RuntimeError(f'No exported sections of course {course_id}')
+    parts_dir = toc_parts[0].parent
+    course_dir = parts_dir.parent
+    parts = [Course.from_toc(toc_part) for toc_part in toc_parts]
+    sections = sorted((section for part in parts for section in part.sections), key=lambda s: s.position)
+    # Every section job fetched the progress of the whole course
+    course = replace(parts[0], sections=sections, progress=parts[0].progress if settings.fetch_progress else '')
+    course.update_hash()
+    stats_parts = []
+    for stats_part in sorted(parts_dir.glob(f'stats_{course_id}_*.json')):
+        with open(stats_part, encoding='utf-8') as f:
+            stats_parts.append(json.load(f))
+
+    # Lesson files of the previous export that are not in the course anymore
+    old_toc = course_dir / f'toc_{course_id}.yaml'
+    stale_files = set()
+    if old_toc.exists():
+        stale_files = set(Course.from_toc(old_toc).lesson_files().values()) - set(course.lesson_files().values())
+    course.save_structure(output_dir, only_lessons=set(), stats=merge_course_stats(stats_parts))
+    for path in stale_files:
+        (course_dir / path).unlink(missing_ok=True)
+
+    errors = []
+    for errors_part in sorted(parts_dir.glob(f'errors_{course_id}_*.json')):
+        with open(errors_part, encoding='utf-8') as f:
+            errors += json.load(f)['errors']
+    errors_file = course_dir / f'errors_{course_id}.json'
+    if errors:
+        errors_file.write_text(json.dumps({'course': course_id, 'count': len(errors), 'errors': errors},
+                                          ensure_ascii=False, indent=1), encoding='utf-8')
+    else:
+        errors_file.unlink(missing_ok=True)
+
+    shutil.rmtree(parts_dir)
+    print(f"Merged {len(sections)} sections into {course_dir / f'toc_{course_id}.yaml'}")
+    if errors:
+        print(f"{len(errors)} objects could not be exported, see {errors_file}")
+    return True
+
+def discard_sections(course_id: int, output_dir: Path) -> bool:
+    """Remove exported sections of a course some of whose section jobs failed; always False (course failed)"""
+    for toc_part in output_dir.glob(f'*/.parts/toc_{course_id}_*.yaml'):
+        course_dir = toc_part.parent.parent
+        old_toc = course_dir / f'toc_{course_id}.yaml'
+        kept = set(Course.from_toc(old_toc).lesson_files().values()) if old_toc.exists() else set()
+        # Lesson files the previous export does not have
+        for path in set(Course.from_toc(toc_part).lesson_files().values()) - kept:
+            lesson_file = course_dir / path
+            lesson_file.unlink(missing_ok=True)
+            if lesson_file.parent.is_dir() and not any(lesson_file.parent.iterdir()):
+                lesson_file.parent.rmdir()
+    for part in output_dir.glob(f'*/.parts/*_{course_id}_*'):
+        part.unlink()
+    for parts_dir in output_dir.glob('*/.parts'):
+        if not any(parts_dir.iterdir()):
+            parts_dir.rmdir()
+    print(f"Sections of course {course_id} failed, its previous export is left as it was")
+    return False
+
+def run_job(job: Job, output_dir: Path) -> bool:
+    """Run one job; False if it failed"""
+    if job.kind == 'section':
+        return export_section(job.course_id, job.section, output_dir)
+    if job.kind == 'merge':
+        return merge_sections(job.course_id, output_dir)
+    if job.kind == 'discard':
+        return discard_sections(job.course_id, output_dir)
+    from .cli import export_course
+    return export_course(job.course_id, output_dir)
+
+def keep_lease(queue: WorkQueue, job: Job, worker: str, stopped: threading.Event):
+    """Send heartbeats for job until stopped"""
+    while not stopped.wait(settings.queue_lease_seconds / 3):
+        if not queue.heartbeat(job, worker):
+            print(f"Lease of {job} was lost, it may be run again elsewhere")
+            return
+
+def run_worker(queue: WorkQueue, output_dir: Path) -> int:
+    """Run jobs from queue until none are pending or leased; returns number of failed jobs"""
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    failed = 0
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            counts = queue.counts()
+            if not counts.get('pending') and not counts.get('leased'):
+                break
+            # Other workers are busy; their jobs come back if they crash
+            time.sleep(settings.queue_poll_interval)
+            continue
+
+        print(f"\n{worker}: {job} (attempt {job.attempts})")
+        stopped = threading.Event()
+        heartbeat = threading.Thread(target=keep_lease, args=(queue, job, worker, stopped), daemon=True)
+        heartbeat.start()
+        message = ''
+        retry = False
+        try:
+            ok = run_job(job, output_dir)
+        except api.AuthorizationError:
+            queue.complete(job, worker, False, 'not authorized')
+            raise
+        except Exception as e:
+            ok = False
+            retry = True
+            message = f'{type(e).__name__}: {e}'
+            print(f"Error: {message}")
+        finally:
+            stopped.set()
+            heartbeat.join()
+        queue.complete(job, worker, ok, message, retry)
+        failed += not ok
+    print(f"\nQueue finished: {queue.counts()}")
+    return failed
@@ -0,0 +1,39 @@
+# Errors collected during an export instead of aborting it
+import json
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Set
+
+@dataclass
+class ExportError:
+    """Object that could not be fetched or converted"""
+    obj_class: str
+    obj_id: int
+    message: str
+    context: str = ''  # where in the course, e.g. lesson menu number
+
+    def __str__(self) -> str:
+        where = f' ({self.context})' if self.context else ''
+        return f'{self.obj_class} {self.obj_id}{where}: {self.message}'
+
+class ErrorLog:
+    """Errors of one export run; the course is exported without the failed objects"""
+
+    def __init__(self):
+        self.errors: List[ExportError] = []
+
+    def __len__(self) -> int:
+        return len(self.errors)
+
+    def add(self, obj_class: str, obj_id: int, message: str, context: str = ''):
+        """Record a failed object"""
+        self.errors.append(ExportError(obj_class, obj_id, message, context))
+
+    def failed_ids(self, obj_class: str) -> Set[int]:
+        """Ids of failed objects of a class"""
+        return {error.obj_id for error in self.errors if error.obj_class == obj_class}
+
+    def to_json(self, course_id: Optional[int] = None) -> str:
+        """Errors report"""
+        return json.dumps({'course': course_id, 'count': len(self.errors),
+                           'errors': [asdict(error) for error in self.errors]},
+                          ensure_ascii=False, indent=1)
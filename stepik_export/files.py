@@ -0,0 +1,18 @@
+# Files replaced whole: caches, stores and manifests shared by threads, processes and nodes
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+@contextmanager
+def atomic_write(path: Path) -> Iterator[Path]:
+    """Temporary file to write instead of path, moved over it when done; readers never see it half-written"""
+    # One per process and thread: several of them may write the same file at once
+    temp_file = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        yield temp_file
+        os.replace(temp_file, path)
+    except BaseException:
+        temp_file.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,223 @@
+# Conversion of step HTML to Markdown
+import re
+import hashlib
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+from . import settings
+from .files import atomic_write
+
+# Bump when conversion output changes, so cached results are not reused
+html_converter_version = 4
+
+# LaTeX as written in Stepik step text: $$...$$, \(...\), \[...\]
+math_re = re.compile(r'(\$\$.+?\$\$|\\\(.+?\\\)|\\\[.+?\\\])', re.S)
+# Emphasis and code markers, the end of link text ('[' alone is not escaped: \[ starts
+# LaTeX), and text Markdown would read as an HTML tag or entity
+markdown_special_re = re.compile(r'([*_`\]]|<(?=[A-Za-z/!?])|&(?=#?\w+;))')
+# Fenced code blocks of the output, possibly indented (in list items) or quoted
+fenced_code_re = re.compile(r'^[ >]*```[^\n]*\n.*?^[ >]*```[ \t]*$', re.M | re.S)
+# Text at the start of a line that Markdown would read as a heading, quote, list, rule or table
+line_start_re = re.compile(r'^(\s*)(\d+(?=[.)](?:\s|$))|[#>|]|[+=-](?=[\s=-]|$))')
+block_tags = {'p', 'div', 'section', 'article', 'header', 'footer', 'figure', 'figcaption'}
+# Tags whose Markdown starts with markup before their text (or that are table cells)
+prefixed_tags = {'strong', 'b', 'em', 'i', 's', 'del', 'strike', 'a', 'td', 'th', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+void_tags = {'img', 'br', 'hr', 'input', 'meta', 'link', 'source', 'wbr', 'col'}
+
+def outside_code(markdown: str, rewrite) -> str:
+    """markdown with rewrite applied to the text between fenced code blocks"""
+    parts = []
+    start = 0
+    for match in fenced_code_re.finditer(markdown):
+        parts += [rewrite(markdown[start:match.start()]), match.group(0)]
+        start = match.end()
+    parts.append(rewrite(markdown[start:]))
+    return ''.join(parts)
+
+def collapse_blank_lines(markdown: str) -> str:
+    """At most one blank line in a row, outside code blocks"""
+    return outside_code(markdown, lambda text: re.sub(r'\n{3,}', '\n\n', text))
+
+class HtmlToMarkdown(HTMLParser):
+    """Streaming converter of Stepik step HTML to Markdown.
+    
+    Every open tag gets a frame collecting rendered children; the frame is
+    rendered into its parent when the tag closes.
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = [('root', {}, [])]
+    
+    def _in(self, *tags) -> bool:
+        return any(frame[0] in tags for frame in self.stack)
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in void_tags:
+            self._append(self._render(tag, attrs, []))
+        else:
+            self.stack.append((tag, attrs, []))
+    
+    def handle_startendtag(self, tag, attrs):
+        self._append(self._render(tag, dict(attrs), []))
+    
+    def handle_endtag(self, tag):
+        if tag in void_tags or not any(frame[0] == tag for frame in self.stack[1:]):
+            return
+        # Close unclosed children too (<li> and <p> often are)
+        while True:
+            name, attrs, parts = self.stack.pop()
+            self._append(self._render(name, attrs, parts))
+            if name == tag:
+                break
+    
+    def handle_data(self, data):
+        if self._in('script', 'style'):
+            return
+        if self._in('pre'):
+            self._append(data)
+            return
+        data = re.sub(r'\s+', ' ', data)
+        if self._in('code') or self._in_math():
+            self._append(data)
+            return
+        if self._at_line_start():
+            data = line_start_re.sub(lambda m: f'{m.group(1)}{m.group(2)}\\' if m.group(2)[0].isdigit()
+                                     else f'{m.group(1)}\\{m.group(2)}', data)
+        segments = math_re.split(data)
+        self._append(''.join(segment if i % 2 else markdown_special_re.sub(r'\\\1', segment)
+                             for i, segment in enumerate(segments)))
+    
+    def _at_line_start(self) -> bool:
+        # Text rendered so far in the enclosing block ends with a newline or is empty
+        for name, attrs, parts in reversed(self.stack):
+            for part in reversed(parts):
+                if isinstance(part, str) and part.strip(' '):
+                    return part.rstrip(' ').endswith('\n')
+            if name in prefixed_tags:
+                return False
+            if name in block_tags or name in ('li', 'blockquote'):
+                return True
+        return True
+    
+    def _in_math(self) -> bool:
+        return any('math-tex' in (frame[1].get('class') or '') for frame in self.stack)
+    
+    def _append(self, part):
+        if part:
+            self.stack[-1][2].append(part)
+    
+    def _render(self, tag, attrs, parts):
+        # Table rows and cells, list items travel up as tuples
+        text = ''.join(part for part in parts if isinstance(part, str))
+        if self._in('pre') and tag != 'code':
+            # Markup inside code blocks is kept as plain text
+            return '\n' if tag == 'br' else text
+        if tag in block_tags:
+            return f'\n\n{text.strip()}\n\n'
+        if len(tag) == 2 and tag[0] == 'h' and tag[1] in '123456':
+            return f'\n\n{"#" * int(tag[1])} {text.strip()}\n\n'
+        if tag in ('strong', 'b'):
+            return f'**{text.strip()}**' if text.strip() else text
+        if tag in ('em', 'i'):
+            return f'*{text.strip()}*' if text.strip() else text
+        if tag in ('s', 'del', 'strike'):
+            return f'~~{text.strip()}~~' if text.strip() else text
+        if tag == 'code':
+            if self._in('pre'):
+                return ('code', attrs, text)
+            fence = '``' if '`' in text else '`'
+            return f'{fence}{text}{fence}'
+        if tag == 'pre':
+            code = next((part for part in parts if isinstance(part, tuple) and part[0] == 'code'), None)
+            if code:
+                attrs, text = code[1], code[2]
+            language = re.search(r'(?:language|lang)-(\S+)', attrs.get('class') or '')
+            return f'\n\n```{language.group(1) if language else ""}\n{text.strip(chr(10))}\n```\n\n'
+        if tag == 'a':
+            href = attrs.get('href')
+            return f'[{text.strip()}]({href})' if href else text
+        if tag == 'img':
+            alt = re.sub(r'([\\\]])', r'\\\1', attrs.get('alt') or '')
+            return f'![{alt}]({attrs.get("src") or ""})'
+        if tag == 'br':
+            return '<br>' if self._in('td', 'th') else '  \n'
+        if tag == 'hr':
+            return '\n\n---\n\n'
+        if tag == 'li':
+            return ('li', collapse_blank_lines(text.strip()))
+        if tag in ('ul', 'ol'):
+            items = [part[1] for part in parts if isinstance(part, tuple) and part[0] == 'li']
+            lines = []
+            for i, item in enumerate(items, 1):
+                marker = f'{i}. ' if tag == 'ol' else '- '
+                item_lines = item.split('\n')
+                lines.append(marker + item_lines[0])
+                lines += [' ' * len(marker) + line if line else '' for line in item_lines[1:]]
+            return '\n\n' + '\n'.join(lines) + '\n\n'
+        if tag == 'blockquote':
+            quoted = collapse_blank_lines(text.strip()).split('\n')
+            return '\n\n' + '\n'.join(f'> {line}' if line else '>' for line in quoted) + '\n\n'
+        if tag in ('td', 'th'):
+            cell = re.sub(r'\s*\n\s*', '<br>', text.strip()).replace('|', '\\|')
+            return ('cell', cell, tag == 'th')
+        if tag == 'tr':
+            return ('tr', [part for part in parts if isinstance(part, tuple) and part[0] == 'cell'])
+        if tag in ('thead', 'tbody', 'tfoot'):
+            return [part for part in parts if isinstance(part, tuple) and part[0] == 'tr']
+        if tag == 'table':
+            rows = []
+            for part in parts:
+                rows += part if isinstance(part, list) else [part] if isinstance(part, tuple) else []
+            rows = [[cell[1] for cell in row[1]] for row in rows if row[0] == 'tr' and row[1]]
+            if not rows:
+                return text
+            width = max(len(row) for row in rows)
+            rows = [row + [''] * (width - len(row)) for row in rows]
+            lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + ' --- |' * width]
+            lines += ['| ' + ' | '.join(row) + ' |' for row in rows[1:]]
+            return '\n\n' + '\n'.join(lines) + '\n\n'
+        if tag in ('script', 'style'):
+            return ''
+        return text
+    
+    def convert(self, text: str) -> str:
+        """Convert HTML string to Markdown"""
+        self.feed(text)
+        self.close()
+        while len(self.stack) > 1:
+            name, attrs, parts = self.stack.pop()
+            self._append(self._render(name, attrs, parts))
+        markdown = ''.join(part for part in self.stack[0][2] if isinstance(part, str))
+        # Spaces at line ends are kept only as line breaks (two of them), except in code
+        markdown = outside_code(markdown, lambda text: re.sub(
+            r'[ \t]+\n', lambda m: '  \n' if m.group(0).startswith('  ') else '\n', text))
+        return collapse_blank_lines(markdown).strip()
+
+# Recently converted step texts by content hash
+markdown_cache: 'OrderedDict[str, str]' = OrderedDict()
+
+def html_to_markdown(text: str) -> str:
+    """Convert step HTML to Markdown, reusing results for unchanged HTML"""
+    if not text:
+        return ''
+    key = hashlib.sha1(f'{html_converter_version}:{text}'.encode()).hexdigest()
+    if key in markdown_cache:
+        markdown_cache.move_to_end(key)
+        return markdown_cache[key]
+    cache_file = settings.markdown_cache_dir / key[:2] / f'{key}.md' if settings.markdown_cache_dir else None
+    if cache_file and cache_file.exists():
+        markdown = cache_file.read_text(encoding='utf-8')
+    else:
+        markdown = HtmlToMarkdown().convert(text)
+        if cache_file:
+            # Render workers may write the same entry at once
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_write(cache_file) as temp_file:
+                temp_file.write_text(markdown, encoding='utf-8')
+    markdown_cache[key] = markdown
+    if len(markdown_cache) > settings.markdown_cache_entries:
+        markdown_cache.popitem(last=False)
+    return markdown
+
@@ -0,0 +1,81 @@
+# Cached API responses with their validators, for conditional requests
+import json
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+@dataclass
+class CachedResponse:
+    """Body of an earlier 200 response and the validators it came with"""
+    body: bytes
+    etag: str = ''
+    last_modified: str = ''
+
+    def validators(self) -> dict:
+        """Headers making the request conditional on the response having changed"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache:
+    """API responses by URL in an SQLite file.
+
+    Batch responses are also indexed by their object ids, so a later run can
+    request the same batches (and get 304s) whatever the batch sizer says.
+    Entries not used for max_age seconds are dropped when the cache is opened.
+    """
+
+    def __init__(self, path: Path, max_age: float = 30 * 24 * 3600):
+        self.path = path
+        self.lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY, obj_class TEXT, first_id TEXT, ids TEXT,
+            etag TEXT, last_modified TEXT, body BLOB, used_at REAL)''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS batches ON responses (obj_class, first_id)')
+        self.db.execute('DELETE FROM responses WHERE used_at < ?', (time.time() - max_age,))
+        self.db.commit()
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        """Cached response for url"""
+        with self.lock:
+            row = self.db.execute('SELECT body, etag, last_modified FROM responses WHERE url = ?',
+                                  (url,)).fetchone()
+        return CachedResponse(*row) if row else None
+
+    def put(self, url: str, response: CachedResponse, obj_class: str = '', obj_ids: List = ()):
+        """Store response of url (a batch of obj_ids of obj_class)"""
+        first_id = str(obj_ids[0]) if obj_ids else ''
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (url, obj_class, first_id, json.dumps(list(obj_ids)), response.etag,
+                             response.last_modified, response.body, time.time()))
+            self.db.commit()
+
+    def touch(self, url: str):
+        """Mark response of url as still in use (it was revalidated)"""
+        with self.lock:
+            self.db.execute('UPDATE responses SET used_at = ? WHERE url = ?', (time.time(), url))
+            self.db.commit()
+
+    def cached_batch(self, obj_class: str, obj_ids: List) -> List:
+        """Longest cached batch of obj_class whose ids start obj_ids ([] if none)"""
+        if not obj_ids:
+            return []
+        with self.lock:
+            rows = self.db.execute('SELECT ids FROM responses WHERE obj_class = ? AND first_id = ?',
+                                   (obj_class, str(obj_ids[0]))).fetchall()
+        batches = [json.loads(ids) for ids, in rows]
+        return max((ids for ids in batches if ids == list(obj_ids[:len(ids)])), key=len, default=[])
+
+    def close(self):
+        """Close the cache file"""
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,92 @@
+# Checkpoint journal for resumable exports
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional
+
+from . import settings
+from .spill import PayloadStore
+
+class ExportJournal:
+    """Checkpoint journal of an export run (JSON lines).
+    
+    Records every fetched batch of objects and every written lesson file,
+    so a failed export can be rerun without fetching or writing them again.
+    The journal is removed when the export finishes without errors.
+    Step blocks loaded from it go to payloads, if given, to stay within
+    its memory budget.
+    """
+    
+    def __init__(self, path: Path, payloads: Optional[PayloadStore] = None):
+        self.path = path
+        self.payloads = payloads
+        self.objects: Dict[str, Dict[int, dict]] = {}
+        self.lessons: Dict[int, str] = {}
+        self.resumed = False
+        if path.exists() and time.time() - path.stat().st_mtime < settings.checkpoint_max_age:
+            self._load()
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('', encoding='utf-8')
+        self.file = open(path, 'a', encoding='utf-8')
+        # Progress is fetched (and recorded) in another thread
+        self.lock = threading.Lock()
+    
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line may be cut short by the failure
+                    break
+                if record['kind'] == 'batch':
+                    objs = self.objects.setdefault(record['class'], {})
+                    for obj in record['objects']:
+                        if self.payloads and record['class'] == 'step-source':
+                            obj = dict(obj, block=self.payloads.put(obj['id'], obj['block']))
+                        objs[obj['id']] = obj
+                elif record['kind'] == 'lesson':
+                    self.lessons[record['id']] = record['file']
+        if self.payloads:
+            self.payloads.flush()
+        self.resumed = bool(self.objects or self.lessons)
+    
+    def _write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+    
+    def get_objects(self, obj_class: str, obj_ids: List[int]) -> List[dict]:
+        """Objects of obj_class already fetched by a previous run"""
+        objs = self.objects.get(obj_class, {})
+        return [objs[obj_id] for obj_id in obj_ids if obj_id in objs]
+    
+    def record_batch(self, obj_class: str, objs: List[dict]):
+        """Record a fetched batch (on disk only: the caller keeps the objects)"""
+        self._write({'kind': 'batch', 'class': obj_class, 'objects': objs})
+    
+    def is_lesson_written(self, lesson_id: int, exists) -> bool:
+        """Whether lesson file was written by a previous run and is still there.
+        
+        exists checks a path relative to course dir.
+        """
+        return lesson_id in self.lessons and exists(self.lessons[lesson_id])
+    
+    def record_lesson(self, lesson_id: int, file: str):
+        """Record a written lesson file (relative to course dir)"""
+        self.lessons[lesson_id] = file
+        self._write({'kind': 'lesson', 'id': lesson_id, 'file': file})
+    
+    def close(self):
+        """Stop recording; the journal is kept for the next run"""
+        self.file.close()
+    
+    def finish(self):
+        """Export completed: journal is not needed anymore"""
+        self.file.close()
+        os.remove(self.path)
+
@@ -0,0 +1,174 @@
+# Link checker: external URLs of exported lessons, checked concurrently
+import re
+import json
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from . import settings
+from .assets import read_asset_paths
+from .files import atomic_write
+from .models import Course, split_steps
+
+# URLs in Markdown links and images, autolinks and HTML attributes left in
+# the text; one level of parentheses is allowed inside a URL
+url_re = re.compile(r'https?://(?:[^\s()<>"\'\]]|\([^\s()<>"\']*\))+')
+local_link_re = re.compile(r'\]\((\.\./assets/[^)\s]+)\)|(?:src|href)\s*=\s*["\'](\.\./assets/[^"\']+)["\']')
+# Servers that do not answer HEAD properly
+head_refused = {403, 405, 501}
+
+@dataclass
+class Link:
+    """External URL used by a step of an exported course"""
+    url: str
+    course_id: int
+    menu_number: str
+    step_id: int
+    step_title: str
+
+@dataclass
+class LinkStatus:
+    """Result of checking a URL"""
+    url: str
+    status: int  # HTTP status, 0 if there was no response
+    error: str = ''
+    checked_at: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """Whether the URL works (redirects were followed)"""
+        return 200 <= self.status < 400
+
+def step_urls(markdown: str, asset_urls: Dict[str, List[str]]) -> List[str]:
+    """External URLs in Markdown of a step; downloaded media count as their original URLs"""
+    urls = [url.rstrip('.,;:') for url in url_re.findall(markdown)]
+    for match in local_link_re.finditer(markdown):
+        urls += asset_urls.get(match.group(1) or match.group(2), [])
+    return list(dict.fromkeys(urls))
+
+def collect_links(course: Course, course_dir: Path) -> List[Link]:
+    """External links of every step of an exported course, in menu order"""
+    asset_urls = defaultdict(list)
+    for url, path in read_asset_paths(course_dir).items():
+        asset_urls[path].append(url)
+    lesson_files = course.lesson_files()
+    links = []
+    for section in course.sections:
+        for lesson in section.lessons:
+            lesson_file = course_dir / lesson_files[lesson.lesson_id]
+            if not lesson_file.exists():
+                continue
+            bodies = split_steps(lesson_file.read_text(encoding='utf-8'), lesson)
+            if bodies is None:
+                # Step headers were edited: URLs are attributed to the lesson's first step
+                bodies = [lesson_file.read_text(encoding='utf-8')] + [''] * (len(lesson.steps) - 1)
+            for step, markdown in zip(lesson.steps, bodies):
+                links += [Link(url, course.course_id, lesson.menu_number, step.step_id, step.title)
+                          for url in step_urls(markdown, asset_urls)]
+    return links
+
+class LinkChecker:
+    """Checks URLs with a thread pool, at most per_host requests to a host at a time.
+
+    Results are cached in cache_file: working URLs are not checked again for
+    settings.link_cache_age seconds, broken ones are checked every time.
+    """
+
+    def __init__(self, workers: int, per_host: int, cache_file: Optional[Path] = None):
+        self.workers = workers
+        self.per_host = per_host
+        self.cache_file = cache_file
+        self.host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'stepik-export link checker'
+        self.cache: Dict[str, LinkStatus] = {}
+        if cache_file and cache_file.exists():
+            with open(cache_file, encoding='utf-8') as f:
+                self.cache = {url: LinkStatus(**entry) for url, entry in json.load(f).items()}
+
+    def host_limit(self, url: str) -> threading.BoundedSemaphore:
+        """Semaphore limiting requests to the host of url"""
+        host = urlparse(url).netloc.lower()
+        with self.lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.per_host)
+            return self.host_limits[host]
+
+    def check_url(self, url: str) -> LinkStatus:
+        """HEAD url, or GET it (without reading the body) if HEAD is refused"""
+        with self.host_limit(url):
+            try:
+                response = self.session.head(url, allow_redirects=True, timeout=settings.request_timeout)
+                if response.status_code in head_refused:
+                    with self.session.get(url, allow_redirects=True, stream=True,
+                                          timeout=settings.request_timeout) as response:
+                        pass
+                return LinkStatus(url, response.status_code, '' if response.ok else response.reason,
+                                  time.time())
+            except requests.RequestException as e:
+                return LinkStatus(url, 0, type(e).__name__, time.time())
+
+    def check(self, urls: List[str]) -> Dict[str, LinkStatus]:
+        """Status of each of urls, from the cache or checked now"""
+        urls = list(dict.fromkeys(urls))
+        fresh_after = time.time() - settings.link_cache_age
+        results = {url: self.cache[url] for url in urls
+                   if url in self.cache and self.cache[url].ok and self.cache[url].checked_at > fresh_after}
+        pending = [url for url in urls if url not in results]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for status in pool.map(self.check_url, pending):
+                results[status.url] = self.cache[status.url] = status
+        self.save_cache()
+        return results
+
+    def save_cache(self):
+        """Write cached results"""
+        if not self.cache_file:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.cache_file) as temp_file, open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({url: vars(status) for url, status in self.cache.items()}, f)
+
+def link_report(course_id: int, links: List[Link], results: Dict[str, LinkStatus]) -> dict:
+    """Broken links of a course by menu number and step"""
+    broken = [{'menu': link.menu_number, 'step': link.step_id, 'title': link.step_title, 'url': link.url,
+               'status': results[link.url].status, 'error': results[link.url].error}
+              for link in links if not results[link.url].ok]
+    return {'course': course_id, 'links': len(links), 'urls': len({link.url for link in links}),
+            'broken_count': len(broken), 'broken': broken}
+
+def check_links(toc_files: List[Path]) -> int:
+    """Check links of exported courses, writing links_{id}.json next to each TOC; number of broken links"""
+    courses = []
+    for toc_file in toc_files:
+        course = Course.from_toc(toc_file)
+        courses.append((toc_file, course.course_id, collect_links(course, toc_file.parent)))
+    urls = [link.url for _, _, links in courses for link in links]
+    print(f"Checking {len(set(urls))} URLs of {len(courses)} courses...")
+    checker = LinkChecker(settings.link_check_workers, settings.link_check_per_host,
+                          settings.cache_dir / 'links.json' if settings.cache_dir else None)
+    started = time.monotonic()
+    results = checker.check(urls)
+    broken = 0
+    for toc_file, course_id, links in courses:
+        report = link_report(course_id, links, results)
+        report_file = toc_file.parent / f'links_{course_id}.json'
+        report_file.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding='utf-8')
+        broken += report['broken_count']
+        print(f"\n{toc_file.parent.name}: {report['links']} links, {report['broken_count']} broken ({report_file})")
+        for entry in report['broken'][:10]:
+            print(f"  {entry['menu']} step {entry['step']}: {entry['url']} "
+                  f"({entry['status'] or entry['error']})")
+    print(f"\nChecked in {time.monotonic() - started:.1f} s")
+    return broken
@@ -0,0 +1,153 @@
+# Conversion of lesson Markdown back to step HTML (for deploy)
+import re
+from html import escape
+from typing import List
+
+from .html_markdown import math_re
+
+fence_re = re.compile(r'^```\s*(\S*)\s*$')
+heading_re = re.compile(r'^(#{1,6})\s+(.*)$')
+list_item_re = re.compile(r'^(-|\*|\d+\.)\s+(.*)$')
+table_separator_re = re.compile(r'^\|?(\s*:?-{3,}:?\s*\|)+\s*:?-*:?\s*$')
+# Verbatim inline parts, whichever starts first: code span, math, backslash escape
+verbatim_re = re.compile(r'(``?)(.+?)\1|(?s:(' + math_re.pattern + r'))|\\([!-/:-@\[-`{-~])')
+image_re = re.compile(r'!\[([^\]]*)\]\(([^)\s]*)\)')
+link_re = re.compile(r'\[([^\]]+)\]\(([^)\s]+)\)')
+stashed_re = re.compile('\x00(\\d+)\x00')
+emphasis_res = [
+    (re.compile(r'\*\*(.+?)\*\*'), 'strong'),
+    (re.compile(r'~~(.+?)~~'), 's'),
+    (re.compile(r'(?<![\\*])\*(?!\s)(.+?)(?<![\s\\])\*'), 'em'),
+]
+
+def quote_attr(text: str) -> str:
+    """Escaped text made safe as a double-quoted attribute value"""
+    return text.replace('"', '&quot;')
+
+def inline_to_html(text: str) -> str:
+    """Convert inline Markdown (code, math, links, emphasis) to HTML"""
+    # Code, math and escaped characters are kept verbatim: stash them before other rules apply
+    stash = []
+
+    def keep(html: str) -> str:
+        stash.append(html)
+        return f'\x00{len(stash) - 1}\x00'
+
+    def verbatim(m: re.Match) -> str:
+        if m.group(2) is not None:
+            return keep(f'<code>{escape(m.group(2), quote=False)}</code>')
+        if m.group(3) is not None:
+            return keep(escape(m.group(3), quote=False))
+        return keep(escape(m.group(5)))
+
+    text = verbatim_re.sub(verbatim, text)
+    text = escape(text, quote=False).replace('&lt;br&gt;', '<br>')
+    # Text is escaped already, except for quotes in attributes
+    text = image_re.sub(lambda m: keep(f'<img src="{quote_attr(m.group(2))}" alt="{quote_attr(m.group(1))}">'),
+                        text)
+    text = link_re.sub(lambda m: f'<a href="{quote_attr(m.group(2))}">{m.group(1)}</a>', text)
+    for pattern, tag in emphasis_res:
+        text = pattern.sub(lambda m: f'<{tag}>{m.group(1)}</{tag}>', text)
+    text = re.sub(r' {2,}\n', '<br>', text)
+    # Stashed HTML may hold stashed parts itself (escapes in image alt text)
+    while stashed_re.search(text):
+        text = stashed_re.sub(lambda m: stash[int(m.group(1))], text)
+    return text
+
+def table_cells(line: str) -> List[str]:
+    """Cells of a Markdown table row"""
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    if line.endswith('|') and not line.endswith('\\|'):
+        line = line[:-1]
+    return [cell.strip() for cell in re.split(r'(?<!\\)\|', line)]
+
+def next_text_indented(lines: List[str], i: int) -> bool:
+    """Whether the next non-blank line after lines[i] is indented (continues a list item)"""
+    following = next((line for line in lines[i + 1:] if line.strip()), '')
+    return following.startswith(' ')
+
+def markdown_to_html(text: str) -> str:
+    """Convert Markdown as written by html_to_markdown (and edited by hand) to step HTML"""
+    lines = text.strip('\n').split('\n')
+    html = []
+    paragraph = []
+
+    def flush_paragraph():
+        if paragraph:
+            html.append(f'<p>{inline_to_html(chr(10).join(paragraph))}</p>')
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        fence = fence_re.match(stripped)
+        if fence:
+            flush_paragraph()
+            code = []
+            i += 1
+            while i < len(lines) and lines[i].strip() != '```':
+                code.append(lines[i])
+                i += 1
+            language = f' class="language-{escape(fence.group(1))}"' if fence.group(1) else ''
+            html.append(f'<pre><code{language}>{escape(chr(10).join(code), quote=False)}</code></pre>')
+        elif not stripped:
+            flush_paragraph()
+        elif heading_re.match(stripped):
+            flush_paragraph()
+            level, title = heading_re.match(stripped).groups()
+            html.append(f'<h{len(level)}>{inline_to_html(title)}</h{len(level)}>')
+        elif stripped == '---':
+            flush_paragraph()
+            html.append('<hr>')
+        elif stripped.startswith('>'):
+            flush_paragraph()
+            quoted = []
+            while i < len(lines) and lines[i].strip().startswith('>'):
+                quoted.append(re.sub(r'^\s*>\s?', '', lines[i]))
+                i += 1
+            html.append(f'<blockquote>{markdown_to_html(chr(10).join(quoted))}</blockquote>')
+            continue
+        elif (stripped.startswith('|') and i + 1 < len(lines)
+              and table_separator_re.match(lines[i + 1].strip())):
+            flush_paragraph()
+            rows = [table_cells(line)]
+            i += 2
+            while i < len(lines) and lines[i].strip().startswith('|'):
+                rows.append(table_cells(lines[i]))
+                i += 1
+            head = ''.join(f'<th>{inline_to_html(cell)}</th>' for cell in rows[0])
+            body = ''.join('<tr>' + ''.join(f'<td>{inline_to_html(cell)}</td>' for cell in row) + '</tr>'
+                           for row in rows[1:])
+            html.append(f'<table><tr>{head}</tr>{body}</table>')
+            continue
+        elif list_item_re.match(line):
+            flush_paragraph()
+            tag = 'ul' if list_item_re.match(line).group(1) in '-*' else 'ol'
+            items = []
+            while i < len(lines):
+                match = list_item_re.match(lines[i])
+                if match:
+                    indent = len(match.group(1)) + 1
+                    items.append([match.group(2)])
+                elif lines[i].startswith(' ') or (not lines[i].strip() and next_text_indented(lines, i)):
+                    items[-1].append(lines[i][indent:])
+                else:
+                    break
+                i += 1
+            body = ''
+            for item in items:
+                item_html = markdown_to_html('\n'.join(item))
+                # Single-paragraph items do not need <p>
+                if item_html.count('<p>') == 1 and item_html.startswith('<p>') and item_html.endswith('</p>'):
+                    item_html = item_html[3:-4]
+                body += f'<li>{item_html}</li>'
+            html.append(f'<{tag}>{body}</{tag}>')
+            continue
+        else:
+            paragraph.append(line)
+        i += 1
+    flush_paragraph()
+    return ''.join(html)
@@ -0,0 +1,770 @@
+# Course structure as seen in left menu: Course -> Section -> Lesson -> Step
+import re
+import json
+import html
+import hashlib
+import yaml
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator
+
+from . import settings
+from .assets import media_src_re, rewrite_asset_urls
+from .html_markdown import html_to_markdown
+from .errors import ErrorLog
+from .journal import ExportJournal
+from .selection import CourseSelection
+from .spill import PayloadStore
+from .sinks import OutputSink, DirectorySink
+from .stats import course_stats, stats_to_json, stats_to_csv
+
+# LibYAML loader is much faster on large TOCs, when PyYAML is built with it
+yaml_loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def get_valid_filename(s: str) -> str:
+    """Convert string to valid filename"""
+    return re.sub(r'(?u)[^-\w. ]', '', str(s)).strip()
+
+def course_dir_name(course: 'Course') -> str:
+    """Directory name of a course inside output directory"""
+    return f"{str(course.course_id).zfill(2)}_{get_valid_filename(course.title)}"
+
+def section_dir_name(section: 'Section') -> str:
+    """Directory name of a section inside course directory"""
+    return f"{str(section.position).zfill(2)}_{get_valid_filename(section.title)}"
+
+def lesson_file_name(lesson: 'Lesson') -> str:
+    """File name of a lesson inside section directory (with menu number)"""
+    return f"{lesson.menu_number}_{get_valid_filename(lesson.title)}.md"
+
+def split_steps(text: str, lesson: 'Lesson') -> Optional[List[str]]:
+    """Markdown of each step in lesson file text; None if step headers do not match the TOC"""
+    headers = [f'## {step.title}' for step in lesson.steps]
+    bodies = []
+    in_code = False
+    for line in text.split('\n'):
+        if line.startswith('```'):
+            in_code = not in_code
+        if not in_code and len(bodies) < len(headers) and line.rstrip() == headers[len(bodies)]:
+            bodies.append([])
+        elif bodies:
+            bodies[-1].append(line)
+    if len(bodies) != len(headers):
+        return None
+    return ['\n'.join(body).strip() for body in bodies]
+
+def content_digest(payload) -> str:
+    """Stable hash of JSON-serializable data"""
+    # default: spilled step blocks are mappings, not dicts
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=dict).encode()).hexdigest()
+
+def progress_text(progress: Optional[dict]) -> str:
+    """Progress as shown in the left menu: passed/total steps ('' if unknown)"""
+    if not progress:
+        return ''
+    return f"{progress.get('n_steps_passed', 0)}/{progress.get('n_steps', 0)}"
+
+@dataclass
+class Step:
+    """Step class representing a single step in a lesson"""
+    position: int
+    step_id: int
+    step_type: str
+    title: str = ''
+    content: Dict[str, Any] = field(default_factory=dict)
+    content_hash: str = field(default='', compare=False)
+    passed: Optional[bool] = field(default=None, compare=False)  # None: progress unknown
+    markdown_hash: str = field(default='', compare=False)  # of the step text in the lesson file
+    
+    @classmethod
+    def from_api(cls, step_data: dict, step_source: dict, position: int) -> 'Step':
+        """Create Step from API data"""
+        step_type = step_data['block']['name']
+        # Create title based on step type and position
+        if step_type == 'text':
+            title = f'Шаг TEXT {position}'
+        elif step_type == 'video':
+            title = f'Шаг VIDEO {position}'
+        elif step_type == 'choice':
+            title = f'Шаг QUIZ {position}'
+        elif step_type == 'sort':
+            title = f'Шаг SORT {position}'
+        elif step_type == 'matching':
+            title = f'Шаг MATCH {position}'
+        elif step_type == 'table':
+            title = f'Шаг TABLE {position}'
+        elif step_type == 'number':
+            title = f'Шаг NUMBER {position}'
+        elif step_type == 'string':
+            title = f'Шаг STRING {position}'
+        elif step_type == 'free-answer':
+            title = f'Шаг ESSAY {position}'
+        elif step_type == 'code':
+            title = f'Шаг CODE {position}'
+        elif step_type == 'admin':
+            title = f'Шаг ADMIN {position}'
+        else:
+            title = f'Шаг {step_type.upper()} {position}'
+        
+        step = cls(
+            position=position,
+            step_id=step_data['id'],
+            step_type=step_type,
+            title=title,
+            content=step_source['block']
+        )
+        step.update_hash()
+        return step
+    
+    def update_hash(self) -> str:
+        """Hash of step type and content"""
+        self.content_hash = content_digest([self.step_type, self.content])
+        return self.content_hash
+    
+    def asset_urls(self) -> List[str]:
+        """Media URLs referenced by this step, as written in its content"""
+        urls = media_src_re.findall(self.content.get('text', '') or '')
+        video = self.content.get('video') or {}
+        urls += [url_info['url'] for url_info in video.get('urls', [])]
+        return urls
+    
+    def to_markdown(self) -> str:
+        """Convert step to markdown format"""
+        md_lines = []
+        
+        # Add step header with type and number (like in left menu)
+        md_lines.append(f'## {self.title}')
+        
+        # Add step content based on type
+        if self.step_type == 'text':
+            md_lines.append(html_to_markdown(self.content.get('text', '')))
+        elif self.step_type == 'video':
+            video = self.content.get('video', {})
+            md_lines.append('### Video')
+            if video.get('urls'):
+                for url_info in video['urls']:
+                    md_lines.append(f'[{url_info["quality"]}p]({url_info["url"]})')
+        elif self.step_type == 'choice':
+            md_lines.append(html_to_markdown(self.content.get('text', '')))
+            options = self.content.get('options', [])
+            if options:
+                md_lines.append('\nOptions:')
+                for i, opt in enumerate(options, 1):
+                    md_lines.append(f'{i}. {html_to_markdown(opt.get("text", ""))}')
+        elif self.step_type == 'code':
+            md_lines.append(html_to_markdown(self.content.get('text', '')))
+            md_lines.append('```' + self.content.get('code', 'python'))
+            md_lines.append('# Write your code here')
+            md_lines.append('```')
+        
+        return '\n'.join(md_lines)
+
+@dataclass
+class Lesson:
+    """Lesson class containing steps (appears as numbered item in left menu: X.Y)"""
+    section_position: int
+    lesson_position: int
+    lesson_id: int
+    title: str
+    steps: List[Step] = field(default_factory=list)
+    content_hash: str = field(default='', compare=False)
+    update_date: str = field(default='', compare=False)
+    progress: str = field(default='', compare=False)
+    incomplete: bool = field(default=False, compare=False)  # steps were left out after errors
+    
+    @property
+    def menu_number(self) -> str:
+        """Get lesson number as it appears in left menu (e.g., 2.1)"""
+        return f'{self.section_position}.{self.lesson_position}'
+    
+    @classmethod
+    def from_api(cls, section_pos: int, unit_data: dict, lesson_data: dict, 
+                 steps_data: List[dict], steps_source: List[dict],
+                 errors: Optional[ErrorLog] = None) -> 'Lesson':
+        """Create Lesson from API data; steps that fail are left out and recorded in errors"""
+        lesson = cls(
+            section_position=section_pos,
+            lesson_position=unit_data['position'],
+            lesson_id=lesson_data['id'],
+            title=lesson_data['title'],
+            update_date=lesson_data.get('update_date') or ''
+        )
+        
+        # Sort steps by position
+        steps_data.sort(key=lambda x: x['position'])
+        
+        # Create Step objects
+        failed_sources = errors.failed_ids('step-source') if errors is not None else set()
+        failed = False
+        for i, step_data in enumerate(steps_data, 1):
+            step_source = next((s for s in steps_source if s['id'] == step_data['id']), None)
+            if not step_source:
+                if errors is not None and step_data['id'] not in failed_sources:
+                    errors.add('step', step_data['id'], 'no step source', lesson.menu_number)
+                failed = True
+                continue
+            try:
+                step = Step.from_api(step_data, step_source, i)
+            except (KeyError, TypeError, ValueError) as e:
+                if errors is None:
+                    raise
+                errors.add('step', step_data['id'], f'bad data: {e!r}', lesson.menu_number)
+                failed = True
+                continue
+            lesson.steps.append(step)
+        
+        failed = failed or len(steps_data) < len(lesson_data['steps'])
+        if failed:
+            # Fetch the lesson again next time instead of reusing it as unchanged
+            lesson.update_date = ''
+            lesson.incomplete = True
+        lesson.update_hash()
+        return lesson
+    
+    def update_hash(self) -> str:
+        """Merkle hash of title and steps (their ids, positions and hashes)"""
+        self.content_hash = content_digest(
+            [self.title, [(s.position, s.step_id, s.content_hash) for s in self.steps]])
+        return self.content_hash
+    
+    def to_markdown(self) -> str:
+        """Convert lesson to markdown format with left menu numbering"""
+        md_lines = []
+        
+        # Add lesson header with menu number
+        md_lines.append(f'# {self.menu_number} {self.title}')
+        md_lines.append(f'<!-- lesson_id: {self.lesson_id} -->')
+        md_lines.append('')
+        
+        # Add all steps
+        for step in self.steps:
+            md_lines.append(step.to_markdown())
+            md_lines.append('')
+        
+        return '\n'.join(md_lines)
+    
+    def update_markdown_hashes(self, text: str):
+        """Remember hashes of step texts in lesson file text, to tell local edits from remote changes"""
+        for step, body in zip(self.steps, split_steps(text, self) or []):
+            step.markdown_hash = content_digest(body)
+
+def render_lesson(lesson: Lesson) -> str:
+    """Render one lesson to markdown (runs in render worker processes)"""
+    return lesson.to_markdown()
+
+def render_lessons(lessons: List[Lesson], workers: int = 0) -> Iterator[str]:
+    """Render lessons to markdown, in the given order.
+    
+    With workers > 0 lessons are rendered in a process pool. Each task gets
+    just its Lesson (title, ids and step contents), not the whole course.
+    """
+    if workers <= 0 or len(lessons) < 2:
+        yield from map(render_lesson, lessons)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    chunksize = max(1, len(lessons) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=settings.apply,
+                             initargs=(settings.current(),)) as pool:
+        yield from pool.map(render_lesson, lessons, chunksize=chunksize)
+
+def is_unchanged(previous, obj_data: dict) -> bool:
+    """Whether API object has the same update_date as previously fetched node"""
+    return bool(previous is not None and previous.update_date
+                and previous.update_date == obj_data.get('update_date'))
+
+@dataclass
+class Section:
+    """Section (module) class (appears as top-level number in left menu: 1, 2, 3...)"""
+    position: int
+    section_id: int
+    title: str
+    lessons: List[Lesson] = field(default_factory=list)
+    content_hash: str = field(default='', compare=False)
+    update_date: str = field(default='', compare=False)
+    progress: str = field(default='', compare=False)
+    
+    @classmethod
+    def from_api(cls, section_data: dict, units_data: List[dict], 
+                 lessons_data: List[dict], steps_map: Dict[int, List[dict]], 
+                 steps_source_map: Dict[int, List[dict]],
+                 previous_lessons: Optional[Dict[int, Lesson]] = None,
+                 errors: Optional[ErrorLog] = None) -> 'Section':
+        """Create Section from API data (reusing unchanged previous_lessons).
+        
+        Lessons that fail are left out and recorded in errors.
+        """
+        section = cls(
+            position=section_data['position'],
+            section_id=section_data['id'],
+            title=section_data['title'],
+            update_date=section_data.get('update_date') or ''
+        )
+        
+        # Filter units for this section and sort by position
+        section_units = [u for u in units_data if u['section'] == section_data['id']]
+        section_units.sort(key=lambda x: x['position'])
+        
+        # Create lessons with correct section position
+        for unit in section_units:
+            lesson_data = next((l for l in lessons_data if l['id'] == unit['lesson']), None)
+            previous = (previous_lessons or {}).get(unit['lesson'])
+            if lesson_data and is_unchanged(previous, lesson_data):
+                # Same steps as in previous export, only the place in menu may differ
+                lesson = replace(previous, section_position=section.position,
+                                 lesson_position=unit['position'])
+                section.lessons.append(lesson)
+            elif lesson_data:
+                steps = steps_map.get(lesson_data['id'], [])
+                steps_source = steps_source_map.get(lesson_data['id'], [])
+                try:
+                    lesson = Lesson.from_api(
+                        section.position, 
+                        unit, 
+                        lesson_data, 
+                        steps, 
+                        steps_source,
+                        errors
+                    )
+                except (KeyError, TypeError, ValueError) as e:
+                    if errors is None:
+                        raise
+                    errors.add('lesson', lesson_data['id'], f'bad data: {e!r}',
+                               f"{section.position}.{unit['position']}")
+                    continue
+                section.lessons.append(lesson)
+        
+        section.update_hash()
+        return section
+    
+    def update_hash(self) -> str:
+        """Merkle hash of title and lessons (their ids, positions and hashes)"""
+        self.content_hash = content_digest(
+            [self.title, [(l.lesson_position, l.lesson_id, l.content_hash) for l in self.lessons]])
+        return self.content_hash
+
+@dataclass
+class Course:
+    """Course class containing the full left menu structure"""
+    course_id: int
+    title: str
+    sections: List[Section] = field(default_factory=list)
+    progress: str = ''  # passed/total steps; empty if not fetched (0/total when saved)
+    content_hash: str = field(default='', compare=False)
+    update_date: str = field(default='', compare=False)
+    
+    @classmethod
+    def from_api(cls, course_id: int, journal: Optional[ExportJournal] = None,
+                 previous: Optional['Course'] = None,
+                 selection: Optional[CourseSelection] = None,
+                 errors: Optional[ErrorLog] = None,
+                 payloads: Optional[PayloadStore] = None) -> 'Course':
+        """Fetch course data from API and build full left menu structure.
+        
+        Steps of lessons not updated since the previous version of the course
+        are not fetched again. With selection, only the selected sections and
+        lessons are fetched and included. With errors, objects that cannot be
+        fetched or converted are recorded there and left out of the course.
+        With payloads, step contents beyond its memory budget are spilled to
+        disk as they arrive; step sources are then fetched in chunks.
+        Progress objects (settings.fetch_progress) are fetched in batches
+        alongside the step sources. Pass marks of steps are only refreshed
+        for lessons whose steps are fetched.
+        """
+        # API client (requests) is only loaded by exports that fetch something
+        from concurrent.futures import ThreadPoolExecutor
+        from .api import fetch_object, fetch_objects, fetch_progresses
+        
+        # Get course
+        course_data = fetch_object('course', course_id, journal)
+        
+        course = cls(
+            course_id=course_data['id'],
+            title=course_data['title'],
+            update_date=course_data.get('update_date') or ''
+        )
+        
+        # Get all sections
+        sections_data = fetch_objects('section', course_data['sections'], journal, errors)
+        sections_data.sort(key=lambda x: x['position'])
+        if selection:
+            # Prune the fetch plan before any unit, lesson or step request
+            sections_data = [s for s in sections_data if selection.includes_section(s['position'])]
+        
+        # Get all units
+        all_unit_ids = []
+        for section in sections_data:
+            all_unit_ids.extend(section['units'])
+        units_data = fetch_objects('unit', all_unit_ids, journal, errors)
+        if selection:
+            section_positions = {s['id']: s['position'] for s in sections_data}
+            units_data = [u for u in units_data if selection.includes_lesson(
+                section_positions[u['section']], u['position'], u['lesson'])]
+        
+        # One thread fetches progress while the structure is fetched here
+        progress_pool = ThreadPoolExecutor(max_workers=1) if settings.fetch_progress else None
+        progress_jobs = []
+        if progress_pool:
+            progress_jobs.append(progress_pool.submit(
+                fetch_progresses, [course_data, *sections_data, *units_data], journal))
+        
+        # Get all lessons
+        all_lesson_ids = [unit['lesson'] for unit in units_data]
+        lessons_data = fetch_objects('lesson', all_lesson_ids, journal, errors)
+        
+        # Get all steps for all (changed) lessons at once, so batches span lesson boundaries
+        previous_lessons = {l.lesson_id: l for s in previous.sections for l in s.lessons} if previous else {}
+        all_step_ids = [step_id for lesson in lessons_data
+                        if not is_unchanged(previous_lessons.get(lesson['id']), lesson)
+                        for step_id in lesson['steps']]
+        step_lesson = {step_id: lesson['id'] for lesson in lessons_data for step_id in lesson['steps']}
+        steps_map = {}
+        steps_source_map = {}
+        
+        for step in fetch_objects('step', all_step_ids, journal, errors):
+            steps_map.setdefault(step_lesson[step['id']], []).append(step)
+        for steps in steps_map.values():
+            steps.sort(key=lambda x: x['position'])
+        if progress_pool:
+            progress_jobs.append(progress_pool.submit(
+                fetch_progresses, [step for steps in steps_map.values() for step in steps], journal))
+        
+        chunk_size = settings.spill_chunk_size if payloads else len(all_step_ids) or 1
+        for start in range(0, len(all_step_ids), chunk_size):
+            for step_source in fetch_objects('step-source', all_step_ids[start:start + chunk_size],
+                                             journal, errors):
+                if payloads:
+                    step_source = dict(step_source, block=payloads.put(step_source['id'], step_source['block']))
+                steps_source_map.setdefault(step_lesson[step_source['id']], []).append(step_source)
+            if payloads:
+                payloads.flush()
+        
+        # Create sections
+        for section_data in sections_data:
+            try:
+                section = Section.from_api(
+                    section_data, 
+                    units_data, 
+                    lessons_data,
+                    steps_map,
+                    steps_source_map,
+                    previous_lessons,
+                    errors
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                if errors is None:
+                    raise
+                errors.add('section', section_data['id'], f'bad data: {e!r}', str(section_data.get('position', '')))
+                continue
+            if not selection or section.lessons or section.position in selection.sections:
+                course.sections.append(section)
+        
+        if progress_pool:
+            progresses = {}
+            for job in progress_jobs:
+                progresses.update(job.result())
+            progress_pool.shutdown()
+            course.apply_progress(progresses, course_data, sections_data, units_data,
+                                  [step for steps in steps_map.values() for step in steps])
+        
+        course.update_hash()
+        return course
+    
+    def apply_progress(self, progresses: Dict[str, dict], course_data: dict, sections_data: List[dict],
+                       units_data: List[dict], steps_data: List[dict]):
+        """Set progress of course, sections, lessons and steps from progress objects by id"""
+        def progress_of(obj_data: dict) -> Optional[dict]:
+            return progresses.get(obj_data.get('progress'))
+        
+        self.progress = progress_text(progress_of(course_data)) or self.progress
+        section_progress = {s['id']: progress_of(s) for s in sections_data}
+        lesson_progress = {u['lesson']: progress_of(u) for u in units_data}
+        step_progress = {s['id']: progress_of(s) for s in steps_data}
+        for section in self.sections:
+            section.progress = progress_text(section_progress.get(section.section_id))
+            for lesson in section.lessons:
+                lesson.progress = progress_text(lesson_progress.get(lesson.lesson_id))
+                for step in lesson.steps:
+                    progress = step_progress.get(step.step_id)
+                    if progress:
+                        step.passed = bool(progress.get('is_passed'))
+    
+    @classmethod
+    def from_toc(cls, toc_file: Path) -> 'Course':
+        """Load course structure and hashes from a saved TOC (step contents are not loaded)"""
+        with open(toc_file, encoding='utf-8') as f:
+            toc = yaml.load(f, Loader=yaml_loader)['course']
+        course = cls(course_id=toc['id'], title=toc['title'], progress=toc.get('progress', '0/0'),
+                     content_hash=toc.get('hash', ''))
+        for section_toc in toc['sections']:
+            section = Section(position=section_toc['position'], section_id=section_toc['id'],
+                              title=section_toc['title'], content_hash=section_toc.get('hash', ''),
+                              progress=section_toc.get('progress', ''))
+            for lesson_toc in section_toc['lessons']:
+                lesson = Lesson(section_position=section.position, lesson_position=lesson_toc['position'],
+                                lesson_id=lesson_toc['id'], title=lesson_toc['title'],
+                                content_hash=lesson_toc.get('hash', ''), progress=lesson_toc.get('progress', ''))
+                lesson.steps = [Step(position=step_toc['position'], step_id=step_toc['id'],
+                                     step_type=step_toc['type'], title=step_toc['title'],
+                                     content_hash=step_toc.get('hash', ''), passed=step_toc.get('passed'),
+                                     markdown_hash=step_toc.get('markdown', ''))
+                                for step_toc in lesson_toc['steps']]
+                section.lessons.append(lesson)
+            course.sections.append(section)
+        return course
+    
+    def merge_selection(self, partial: 'Course', selection: CourseSelection) -> 'Course':
+        """This course (e.g. loaded from TOC) with its selected part replaced by partial.
+        
+        partial is the same course fetched with selection. Lessons and
+        sections that were selected but are not in partial anymore are dropped.
+        """
+        sections = {s.section_id: s for s in self.sections}
+        partial_section_ids = {s.section_id for s in partial.sections}
+        partial_lesson_ids = {l.lesson_id for s in partial.sections for l in s.lessons}
+        for new_section in partial.sections:
+            section = sections.get(new_section.section_id)
+            kept = [] if section is None else [
+                l for l in section.lessons
+                if l.lesson_id not in partial_lesson_ids
+                and not selection.includes_lesson(section.position, l.lesson_position, l.lesson_id)]
+            lessons = sorted(kept + new_section.lessons, key=lambda l: l.lesson_position)
+            lessons = [replace(l, section_position=new_section.position) for l in lessons]
+            sections[new_section.section_id] = replace(new_section, lessons=lessons)
+        
+        merged_sections = []
+        for section in sorted(sections.values(), key=lambda s: s.position):
+            if section.section_id not in partial_section_ids:
+                if section.position in selection.sections:
+                    continue
+                # Lessons moved from here into the selected part
+                section = replace(section, lessons=[l for l in section.lessons
+                                                    if l.lesson_id not in partial_lesson_ids])
+            section.update_hash()
+            merged_sections.append(section)
+        
+        # Progress of the whole course comes with the partial fetch
+        course = replace(self, title=partial.title, update_date=partial.update_date,
+                         sections=merged_sections, progress=partial.progress)
+        course.update_hash()
+        return course
+    
+    def update_hash(self) -> str:
+        """Merkle hash of title and sections (their ids, positions and hashes)"""
+        self.content_hash = content_digest(
+            [self.title, [(s.position, s.section_id, s.content_hash) for s in self.sections]])
+        return self.content_hash
+    
+    def update_hashes(self) -> str:
+        """Recompute hashes of the whole tree, bottom-up (after editing it)"""
+        for section in self.sections:
+            for lesson in section.lessons:
+                for step in lesson.steps:
+                    step.update_hash()
+                lesson.update_hash()
+            section.update_hash()
+        return self.update_hash()
+    
+    def get_left_menu_text(self) -> str:
+        """Generate text representation of left menu"""
+        lines = []
+        lines.append(self.title)
+        lines.append(f'Прогресс по курсу:  {self.progress}')
+        lines.append('')
+        
+        for section in self.sections:
+            progress = f'  ({section.progress})' if section.progress else ''
+            lines.append(f'{section.position}  {section.title}{progress}')
+            lines.append('')
+            
+            for lesson in section.lessons:
+                progress = f'  ({lesson.progress})' if lesson.progress else ''
+                lines.append(f'{lesson.menu_number}  {lesson.title}{progress}')
+                lines.append('')
+        
+        return '\n'.join(lines)
+    
+    def asset_urls(self) -> List[str]:
+        """All distinct media URLs referenced by the course steps"""
+        urls = {}
+        for section in self.sections:
+            for lesson in section.lessons:
+                for step in lesson.steps:
+                    urls.update(dict.fromkeys(step.asset_urls()))
+        return list(urls)
+    
+    def download_assets(self, assets_dir: Path, workers: int = 8) -> Dict[str, str]:
+        """Download course media to assets_dir.
+        
+        Returns map of URL (as written in step content) to path relative to
+        assets_dir.
+        """
+        from .assets import download_assets
+        
+        # HTML attributes keep entities (&amp;) that must not be sent to the server
+        urls = self.asset_urls()
+        local_paths = download_assets([html.unescape(url) for url in urls],
+                                      assets_dir, workers)
+        # Converted Markdown has the unescaped form of URLs, keep both
+        course_paths = {}
+        for url in urls:
+            if html.unescape(url) in local_paths:
+                course_paths[url] = course_paths[html.unescape(url)] = local_paths[html.unescape(url)]
+        return course_paths
+    
+    def lesson_files(self) -> Dict[int, str]:
+        """Lesson file paths relative to course directory, by lesson id"""
+        return {lesson.lesson_id: f'{section_dir_name(section)}/{lesson_file_name(lesson)}'
+                for section in self.sections for lesson in section.lessons}
+    
+    def save_structure(self, output_dir: Path, download_media: bool = False,
+                       journal: Optional[ExportJournal] = None,
+                       only_lessons: Optional[set] = None,
+                       sink: Optional[OutputSink] = None,
+                       with_stats: bool = True,
+                       fragment: Optional[int] = None,
+                       stats: Optional[dict] = None) -> Path:
+        """Save course structure to YAML file and lessons to markdown.
+        
+        Files go to sink (loose files in output_dir by default). With
+        only_lessons, just these lesson ids are written; files of other
+        lessons are expected to be up to date already. With fragment (a
+        section position, for distributed exports), TOC and JSON statistics
+        go to .parts/ to be merged later, and the left menu is not written.
+        stats are the statistics of the course if the caller has them
+        already; a progress not fetched is set to 0 of their step count.
+        """
+        if sink is None:
+            sink = DirectorySink(output_dir)
+        if stats is None:
+            stats = course_stats(self)
+        if not self.progress:
+            self.progress = f"0/{stats['steps']}"
+        course_name = course_dir_name(self)
+        course_dir = output_dir / course_name
+        
+        local_paths = {}
+        if download_media:
+            # Archives get copies of the assets from a store outside them
+            if isinstance(sink, DirectorySink):
+                assets_dir = sink.root / course_name / 'assets'
+            else:
+                assets_dir = (settings.cache_dir or output_dir / '.cache') / 'assets'
+            asset_paths = self.download_assets(assets_dir, settings.media_workers)
+            for path in set(asset_paths.values()):
+                sink.add_file(f'{course_name}/assets/{path}', assets_dir / path)
+            if not isinstance(sink, DirectorySink):
+                # Deploy maps local paths back to URLs with it
+                with open(assets_dir / 'manifest.json', encoding='utf-8') as f:
+                    manifest = json.load(f)
+                sink.write_text(f'{course_name}/assets/manifest.json',
+                                json.dumps({url: entry for url, entry in manifest.items() if url in asset_paths},
+                                           indent=1))
+            # Lessons are one level below course dir
+            local_paths = {url: f'../assets/{path}' for url, path in asset_paths.items()}
+        
+        # Prepare TOC structure matching left menu
+        toc = {
+            'course': {
+                'id': self.course_id,
+                'title': self.title,
+                'progress': self.progress,
+                'hash': self.content_hash,
+                'sections': []
+            }
+        }
+        
+        # Save left menu text
+        if fragment is None:
+            sink.write_text(f'{course_name}/left_menu.txt', self.get_left_menu_text())
+        
+        # Render lessons not written yet, possibly in parallel; results come in menu order
+        pending = [lesson for section in self.sections for lesson in section.lessons
+                   if not (journal and journal.is_lesson_written(
+                       lesson.lesson_id, lambda path: sink.exists(f'{course_name}/{path}')))
+                   and (only_lessons is None or lesson.lesson_id in only_lessons)]
+        pending_ids = {lesson.lesson_id for lesson in pending}
+        rendered = render_lessons(pending, settings.render_workers)
+        
+        # Save each section and lesson
+        for section in self.sections:
+            section_dir = course_dir / section_dir_name(section)
+            
+            section_toc = {
+                'position': section.position,
+                'id': section.section_id,
+                'title': section.title,
+                'hash': section.content_hash,
+                'lessons': []
+            }
+            if section.progress:
+                section_toc['progress'] = section.progress
+            
+            for lesson in section.lessons:
+                # Create filename with menu number
+                lesson_file = section_dir / lesson_file_name(lesson)
+                
+                # Save lesson to markdown (unless already written before a failure)
+                lesson_path = lesson_file.relative_to(course_dir).as_posix()
+                if lesson.lesson_id in pending_ids:
+                    text = rewrite_asset_urls(next(rendered), local_paths)
+                    sink.write_lesson(f'{course_name}/{lesson_path}', text, [step.title for step in lesson.steps])
+                    if journal and not lesson.incomplete:
+                        journal.record_lesson(lesson.lesson_id, lesson_path)
+                    lesson.update_markdown_hashes(text)
+                elif any(step.content and not step.markdown_hash for step in lesson.steps):
+                    # Written by the run that failed
+                    lesson.update_markdown_hashes(rewrite_asset_urls(lesson.to_markdown(), local_paths))
+                
+                # Add to TOC with menu number
+                lesson_toc = {
+                    'menu': lesson.menu_number,
+                    'position': lesson.lesson_position,
+                    'id': lesson.lesson_id,
+                    'title': lesson.title,
+                    'file': str(lesson_file.relative_to(course_dir)),
+                    'hash': lesson.content_hash,
+                    'steps': []
+                }
+                if lesson.progress:
+                    lesson_toc['progress'] = lesson.progress
+                
+                for step in lesson.steps:
+                    step_toc = {
+                        'position': step.position,
+                        'id': step.step_id,
+                        'type': step.step_type,
+                        'title': step.title,
+                        'hash': step.content_hash
+                    }
+                    if step.markdown_hash:
+                        step_toc['markdown'] = step.markdown_hash
+                    if step.passed is not None:
+                        step_toc['passed'] = step.passed
+                    source_key = sink.store_step_source(step.content) if step.content else ''
+                    if source_key:
+                        step_toc['source'] = source_key
+                    lesson_toc['steps'].append(step_toc)
+                
+                section_toc['lessons'].append(lesson_toc)
+            
+            toc['course']['sections'].append(section_toc)
+        
+        # Save TOC to YAML
+        if fragment is not None:
+            toc_name = f"{course_name}/.parts/toc_{self.course_id}_{fragment}.yaml"
+            sink.write_text(toc_name, yaml.dump(toc, allow_unicode=True, sort_keys=False))
+            sink.write_text(f"{course_name}/.parts/stats_{self.course_id}_{fragment}.json",
+                            stats_to_json(stats))
+            return sink.location(toc_name)
+        toc_name = f"{course_name}/toc_{self.course_id}.yaml"
+        sink.write_text(toc_name, yaml.dump(toc, allow_unicode=True, sort_keys=False))
+        
+        # Save statistics
+        if with_stats and settings.stats_formats:
+            if 'json' in settings.stats_formats:
+                sink.write_text(f"{course_name}/stats_{self.course_id}.json", stats_to_json(stats))
+            if 'csv' in settings.stats_formats:
+                sink.write_text(f"{course_name}/stats_{self.course_id}.csv", stats_to_csv(stats))
+        
+        return sink.location(toc_name)
+
@@ -0,0 +1,107 @@
+# Sampling profiler for export runs (--profile-run)
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+from . import api, settings
+
+# Pipeline stage of a sample: the first rule matching any frame of the stack
+stage_rules = [
+    # orjson is C code without frames of its own: its time is in decode_objects
+    ('json decode', lambda module, func: (module, func) == ('stepik_export.api', 'decode_objects')
+                                           or module == 'json.decoder'),
+    ('media download', lambda module, func: module == 'stepik_export.assets'),
+    ('fetch wait', lambda module, func: module.split('.')[0] in ('requests', 'urllib3', 'socket', 'ssl', 'http')),
+    ('disk write', lambda module, func: module in ('stepik_export.sinks', 'stepik_export.journal')
+                                          or module.startswith('yaml') or func in ('write_text', 'write_bytes')),
+    ('to_markdown', lambda module, func: module == 'stepik_export.html_markdown'
+                                           or func in ('to_markdown', 'render_lessons')),
+    ('from_api assembly', lambda module, func: func == 'from_api'),
+]
+# Threads waiting for work are not sampled
+idle_frames = {('concurrent.futures.thread', '_worker'), ('socketserver', 'serve_forever')}
+
+def stage_of(frames: List[tuple]) -> str:
+    """Pipeline stage of a stack of (module, function) frames"""
+    return next((name for name, rule in stage_rules if any(rule(module, func) for module, func in frames)), 'other')
+
+class SamplingProfiler:
+    """Samples stacks of all threads every interval seconds, by pipeline stage.
+
+    Render worker processes (render_workers > 0) are not sampled.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.stage_samples: Counter = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start sampling in a background thread"""
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != self.thread.ident:
+                    self._sample(frame)
+
+    def _sample(self, frame):
+        frames = []
+        while frame is not None:
+            frames.append((frame.f_globals.get('__name__', '?'), frame.f_code.co_name))
+            frame = frame.f_back
+        # Innermost frame first; idle pool threads wait in _worker's queue.get
+        if frames[0] in idle_frames or (len(frames) > 1 and frames[1] in idle_frames):
+            return
+        stage = stage_of(frames)
+        stack = ';'.join([stage] + [f'{module}.{func}' for module, func in reversed(frames)])
+        self.samples[stack] += 1
+        self.stage_samples[stage] += 1
+
+    def write_collapsed(self, path: Path):
+        """Write samples in collapsed stack format (flamegraph.pl, speedscope)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+    def summary(self) -> List[str]:
+        """Time per stage, summed over threads"""
+        total = sum(self.stage_samples.values()) or 1
+        return [f'{stage:<20}{count * self.interval:8.2f} s {100 * count / total:5.1f}%'
+                for stage, count in self.stage_samples.most_common()]
+
+@contextmanager
+def profiled(path: Path) -> Iterator[SamplingProfiler]:
+    """Profile the block; write collapsed stacks to path and print stage times and slowest API batches"""
+    profiler = SamplingProfiler()
+    api.batch_log = []
+    started = time.monotonic()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        wall = time.monotonic() - started
+        profiler.write_collapsed(path)
+        print(f"\nProfile ({wall:.2f} s wall time): {path}")
+        for line in profiler.summary():
+            print(f"  {line}")
+        slowest = sorted(api.batch_log, reverse=True)[:settings.slowest_batches_count]
+        if slowest:
+            print("Slowest API batches:")
+            for seconds, obj_class, count, num_bytes in slowest:
+                print(f"  {seconds:6.2f} s  {count:4} {api.plural(obj_class)}  {num_bytes / 1e3:8.1f} KB")
+        api.batch_log = None
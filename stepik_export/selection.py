@@ -0,0 +1,54 @@
+# Selection of a part of a course (--sections, --lessons)
+import re
+from dataclasses import dataclass, field
+from typing import List, Set, Tuple
+
+MenuNumber = Tuple[int, int]
+
+@dataclass
+class CourseSelection:
+    """Sections (by position) and lessons (by menu number range or id) to export"""
+    sections: Set[int] = field(default_factory=set)
+    lesson_ranges: List[Tuple[MenuNumber, MenuNumber]] = field(default_factory=list)
+    lesson_ids: Set[int] = field(default_factory=set)
+
+    @classmethod
+    def parse(cls, sections: str = '', lessons: str = '') -> 'CourseSelection':
+        """Parse selectors like sections='2,5-7' and lessons='3.1-3.4,5.2,123456'.
+
+        Lessons are menu numbers (X.Y) or ranges of them; plain numbers are
+        lesson ids. Raises ValueError on bad syntax.
+        """
+        selection = cls()
+        for item in filter(None, (item.strip() for item in sections.split(','))):
+            match = re.fullmatch(r'(\d+)(?:-(\d+))?', item)
+            if not match:
+                raise ValueError(f'Bad section selector: {item!r}')
+            first, last = int(match.group(1)), int(match.group(2) or match.group(1))
+            if first > last:
+                raise ValueError(f'Bad section range: {item!r}')
+            selection.sections.update(range(first, last + 1))
+        for item in filter(None, (item.strip() for item in lessons.split(','))):
+            if re.fullmatch(r'\d+', item):
+                selection.lesson_ids.add(int(item))
+                continue
+            match = re.fullmatch(r'(\d+)\.(\d+)(?:-(\d+)\.(\d+))?', item)
+            if not match:
+                raise ValueError(f'Bad lesson selector: {item!r}')
+            first = (int(match.group(1)), int(match.group(2)))
+            last = (int(match.group(3)), int(match.group(4))) if match.group(3) else first
+            if first > last:
+                raise ValueError(f'Bad lesson range: {item!r}')
+            selection.lesson_ranges.append((first, last))
+        return selection
+
+    def includes_section(self, position: int) -> bool:
+        """Whether any lesson of section at position may be selected"""
+        return (position in self.sections or bool(self.lesson_ids)
+                or any(first[0] <= position <= last[0] for first, last in self.lesson_ranges))
+
+    def includes_lesson(self, section_position: int, lesson_position: int, lesson_id: int) -> bool:
+        """Whether lesson is selected"""
+        return (section_position in self.sections or lesson_id in self.lesson_ids
+                or any(first <= (section_position, lesson_position) <= last
+                       for first, last in self.lesson_ranges))
@@ -0,0 +1,64 @@
+# Export settings. Defaults below; the command line (cli.py) overrides them.
+from pathlib import Path
+
+api_host = 'https://stepik.org'
+discovery_workers = 4  # course list pages fetched at once
+download_media = False  # download videos and images next to the lessons
+media_workers = 8
+checkpoint_max_age = 24 * 3600  # seconds; older checkpoints are discarded
+fetch_progress = True  # learner progress of the account in the TOC and left menu
+render_workers = 0  # processes rendering lessons to markdown, 0 to render in this process
+memory_budget = None  # MB of step contents kept in memory, the rest is spilled to disk; None: no limit
+spill_chunk_size = 500  # step sources fetched and spilled at a time under a memory budget
+cache_dir = None  # media store for archive output; default: <output dir>/.cache
+markdown_cache_dir = Path.cwd() / 'courses' / '.cache' / 'markdown'  # None: no cache on disk
+markdown_cache_entries = 1000  # converted step texts kept in memory, least recently used ones are dropped
+response_cache_file = Path.cwd() / 'courses' / '.cache' / 'responses.sqlite'  # None: no conditional requests
+watch_interval = 60  # seconds between checks for changes
+status_port = 8765  # watch mode status at http://127.0.0.1:8765/
+stats_formats = ('json',)  # course statistics files next to the TOC: json and/or csv
+largest_lessons_count = 10
+slowest_batches_count = 10  # listed by --profile-run
+output_format = 'dir'  # dir, zip, tar.gz, tar.xz, tar.zst (needs zstandard), sqlite or blobs (snapshots)
+deploy_workers = 4  # step updates sent at once by --deploy
+deploy_requests_per_second = 5
+link_check_workers = 32  # URLs checked at once by --check-links
+link_check_per_host = 4  # requests to one host at a time
+link_cache_age = 7 * 24 * 3600  # seconds working URLs are not checked again; broken ones are checked every run
+queue_split_sections = 10  # distributed export: courses with this many sections get a job per section
+queue_lease_seconds = 300  # a job goes back to the queue if its worker sends no heartbeat for this long
+queue_max_attempts = 3
+queue_poll_interval = 10  # seconds a worker waits while other workers finish their jobs
+
+# Batch sizes for fetch_objects: (initial, min, max) ids per request
+batch_size_limits = {
+    'section': (100, 10, 200),
+    'unit': (100, 10, 200),
+    'lesson': (50, 5, 100),
+    'step': (50, 5, 100),
+    'step-source': (10, 1, 30),
+    'progress': (100, 10, 200),
+}
+default_batch_size_limits = (30, 1, 100)
+max_url_length = 2000            # many proxies reject longer URLs
+target_batch_seconds = 2.0       # shrink batches that answer slower than this
+target_batch_bytes = 2_000_000   # shrink batches with larger responses than this
+request_timeout = 30
+max_batch_retries = 5
+
+# Export profiles (--profile): settings applied before other command line options
+export_profiles = {
+    'default': {},
+    'structure': {'download_media': False, 'stats_formats': ()},
+    'offline': {'download_media': True},
+    'archive': {'download_media': True, 'output_format': 'tar.zst'},
+}
+
+def current() -> dict:
+    """Settings as set now, for worker processes (spawned ones start from the defaults above)"""
+    return {name: value for name, value in globals().items()
+            if not name.startswith('_') and name not in ('Path', 'current', 'apply')}
+
+def apply(values: dict):
+    """Use settings of the parent process (process pool initializer)"""
+    globals().update(values)
@@ -0,0 +1,186 @@
+# Output destinations for exported files: directory, archives, SQLite
+import io
+import os
+import time
+import shutil
+import sqlite3
+import tarfile
+import zipfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List
+
+class OutputSink(ABC):
+    """Destination of exported files; paths are relative to output dir, with '/'"""
+    
+    @abstractmethod
+    def write_bytes(self, path: str, data: bytes):
+        """Write a file"""
+    
+    def write_text(self, path: str, text: str):
+        self.write_bytes(path, text.encode('utf-8'))
+    
+    def add_file(self, path: str, source: Path):
+        """Copy a file from disk"""
+        self.write_bytes(path, source.read_bytes())
+    
+    def write_lesson(self, path: str, text: str, step_titles: List[str]):
+        """Write a lesson file; text has a '## title' header for each of step_titles"""
+        self.write_text(path, text)
+    
+    def store_step_source(self, content: dict) -> str:
+        """Keep step content as exported, for sinks that can; its key ('' if not kept)"""
+        return ''
+    
+    def exists(self, path: str) -> bool:
+        """Whether path was written before this run (new archives start empty)"""
+        return False
+    
+    @abstractmethod
+    def location(self, path: str) -> Path:
+        """Where path ends up, for messages"""
+    
+    def close(self):
+        pass
+    
+    def abort(self):
+        """Discard incomplete output after a failure"""
+        self.close()
+    
+    def __enter__(self) -> 'OutputSink':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class DirectorySink(OutputSink):
+    """Loose files under a directory"""
+    
+    def __init__(self, root: Path):
+        self.root = root
+    
+    def write_bytes(self, path: str, data: bytes):
+        target = self.root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+    
+    def add_file(self, path: str, source: Path):
+        target = self.root / path
+        if target.resolve() != source.resolve():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+    
+    def exists(self, path: str) -> bool:
+        return (self.root / path).exists()
+    
+    def location(self, path: str) -> Path:
+        return self.root / path
+    
+    def abort(self):
+        # Files written so far are kept for resuming
+        pass
+
+class ArchiveSink(OutputSink):
+    """Single archive file, written as a stream to file.part and renamed when complete"""
+    
+    def __init__(self, file: Path):
+        self.file = file
+        self.part_file = file.with_name(file.name + '.part')
+        file.parent.mkdir(parents=True, exist_ok=True)
+    
+    def location(self, path: str) -> Path:
+        return self.file / path
+    
+    def close(self):
+        self._close()
+        os.replace(self.part_file, self.file)
+    
+    def abort(self):
+        self._close()
+        self.part_file.unlink(missing_ok=True)
+    
+    @abstractmethod
+    def _close(self):
+        """Finish writing the archive to part_file"""
+
+class ZipSink(ArchiveSink):
+    """Deflate-compressed zip archive"""
+    
+    def __init__(self, file: Path):
+        super().__init__(file)
+        self.zip = zipfile.ZipFile(self.part_file, 'w', zipfile.ZIP_DEFLATED)
+    
+    def write_bytes(self, path: str, data: bytes):
+        self.zip.writestr(path, data)
+    
+    def add_file(self, path: str, source: Path):
+        self.zip.write(source, path)
+    
+    def _close(self):
+        self.zip.close()
+
+class TarSink(ArchiveSink):
+    """Tar archive compressed on the fly with gz, xz or zst"""
+    
+    def __init__(self, file: Path, compression: str):
+        super().__init__(file)
+        self.raw = None
+        if compression == 'zst':
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError('tar.zst output needs the zstandard package (pip install zstandard)')
+            self.raw = zstandard.ZstdCompressor(threads=-1).stream_writer(open(self.part_file, 'wb'))
+            self.tar = tarfile.open(fileobj=self.raw, mode='w|')
+        else:
+            self.tar = tarfile.open(str(self.part_file), mode=f'w|{compression}')
+    
+    def write_bytes(self, path: str, data: bytes):
+        info = tarfile.TarInfo(path)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.tar.addfile(info, io.BytesIO(data))
+    
+    def add_file(self, path: str, source: Path):
+        self.tar.add(source, path)
+    
+    def _close(self):
+        self.tar.close()
+        if self.raw:
+            self.raw.close()
+
+class SqliteSink(ArchiveSink):
+    """All files as rows of one SQLite database: files(path, data)"""
+    
+    def __init__(self, file: Path):
+        super().__init__(file)
+        self.part_file.unlink(missing_ok=True)
+        self.db = sqlite3.connect(self.part_file)
+        self.db.execute('CREATE TABLE files (path TEXT PRIMARY KEY, data BLOB NOT NULL)')
+    
+    def write_bytes(self, path: str, data: bytes):
+        self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?)', (path, data))
+    
+    def _close(self):
+        self.db.commit()
+        self.db.close()
+
+def open_sink(output_dir: Path, output_format: str, name: str) -> OutputSink:
+    """Create sink for output_format (archives: output_dir/name.<format>, blobs: output_dir/snapshots/name/)"""
+    if output_format == 'dir':
+        return DirectorySink(output_dir)
+    file = output_dir / f'{name}.{output_format}'
+    if output_format == 'zip':
+        return ZipSink(file)
+    if output_format in ('tar.gz', 'tar.xz', 'tar.zst'):
+        return TarSink(file, output_format.split('.')[1])
+    if output_format == 'sqlite':
+        return SqliteSink(file)
+    if output_format == 'blobs':
+        from .blobstore import BlobSink
+        return BlobSink(output_dir, name)
+    raise ValueError(f'Unknown output format: {output_format}')
+
@@ -0,0 +1,172 @@
+# Static HTML site of exported courses, rebuilt incrementally
+import os
+import html
+import json
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from . import settings
+from .blobstore import split_at_headers
+from .files import atomic_write
+from .markdown_html import markdown_to_html
+from .models import Course, Lesson
+
+# Bump when page layout changes, so every page is rebuilt
+site_version = 1
+
+page_template = '''<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ display: flex; margin: 0; font-family: sans-serif; line-height: 1.5; }}
+nav {{ width: 18em; flex-shrink: 0; padding: 1em; background: #f4f4f4; min-height: 100vh; }}
+nav ol {{ padding-left: 1.2em; }} nav .current {{ font-weight: bold; }}
+main {{ max-width: 50em; padding: 1em 2em; }}
+.step {{ border-top: 1px solid #ddd; margin-top: 2em; }}
+pre {{ background: #f8f8f8; padding: .5em; overflow-x: auto; }} img {{ max-width: 100%; }}
+.pager {{ display: flex; justify-content: space-between; margin: 2em 0; }}
+</style>
+</head>
+<body>
+<nav>{nav}</nav>
+<main>
+{content}
+</main>
+</body>
+</html>
+'''
+
+def href(from_page: str, to_page: str) -> str:
+    """Relative URL of to_page from from_page (paths relative to the site root)"""
+    return quote(os.path.relpath(to_page, os.path.dirname(from_page) or '.').replace(os.sep, '/'))
+
+def page_path(course_dir: str, lesson_file: str) -> str:
+    """Site path of the page of a lesson file"""
+    return f'{course_dir}/{Path(lesson_file).with_suffix(".html").as_posix()}'
+
+# Page to render: target file, title, nav HTML, content, and the step headers
+# of a lesson whose content is Markdown (None if content is HTML already)
+PageTask = Tuple[str, str, str, str, Optional[List[str]]]
+
+def render_page(task: PageTask) -> str:
+    """Write one page; runs in worker processes"""
+    target, title, nav, content, step_headers = task
+    if step_headers is not None:
+        # First part is the lesson header, each other one a step
+        parts = split_at_headers(content, step_headers)
+        content = f'<h1>{html.escape(title)}</h1>\n' + ''.join(
+            f'<section class="step" id="step-{i}">{markdown_to_html(part)}</section>\n'
+            for i, part in enumerate(parts[1:], 1))
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    Path(target).write_text(page_template.format(title=html.escape(title), nav=nav, content=content),
+                            encoding='utf-8')
+    return target
+
+class SiteBuilder:
+    """Builds site_dir from exported courses, rendering only pages whose inputs changed.
+
+    A lesson page depends on the lesson file, the menu of its section and
+    its previous and next lessons; a digest of these is kept for each page
+    in site_dir/.build.json.
+    """
+
+    def __init__(self, site_dir: Path):
+        self.site_dir = site_dir
+        self.state_file = site_dir / '.build.json'
+        self.built: Dict[str, str] = {}
+        if self.state_file.exists():
+            with open(self.state_file, encoding='utf-8') as f:
+                self.built = json.load(f)
+        self.pages: Dict[str, str] = {}
+        self.tasks: List[PageTask] = []
+
+    def add_page(self, path: str, title: str, nav: str, content: str, step_headers: Optional[List[str]] = None):
+        """Queue page for rendering unless it is built from the same inputs already"""
+        key = hashlib.sha1(json.dumps([site_version, title, nav, content, step_headers]).encode()).hexdigest()
+        self.pages[path] = key
+        if self.built.get(path) != key or not (self.site_dir / path).exists():
+            self.tasks.append((str(self.site_dir / path), title, nav, content, step_headers))
+
+    def add_course(self, toc_file: Path) -> str:
+        """Queue pages of an exported course; the site path of its index page"""
+        course = Course.from_toc(toc_file)
+        course_dir = toc_file.parent
+        course_name = course_dir.name
+        lesson_files = course.lesson_files()
+        index = f'{course_name}/index.html'
+        lessons: List[Tuple[Lesson, str]] = [(lesson, page_path(course_name, lesson_files[lesson.lesson_id]))
+                                             for section in course.sections for lesson in section.lessons]
+
+        # Course page: the whole left menu
+        menu = [f'<h1>{html.escape(course.title)}</h1>',
+                f'<p>Прогресс по курсу: {html.escape(course.progress)}</p>']
+        for section in course.sections:
+            menu.append(f'<h2>{section.position} {html.escape(section.title)}</h2><ol>')
+            menu += [f'<li><a href="{href(index, page_path(course_name, lesson_files[l.lesson_id]))}">'
+                     f'{l.menu_number} {html.escape(l.title)}</a></li>' for l in section.lessons]
+            menu.append('</ol>')
+        index_nav = f'<a href="{href(index, "index.html")}">Все курсы</a>'
+        self.add_page(index, course.title, index_nav, '\n'.join(menu))
+
+        for i, (lesson, path) in enumerate(lessons):
+            lesson_file = course_dir / lesson_files[lesson.lesson_id]
+            if not lesson_file.exists():
+                continue
+            section = next(s for s in course.sections if s.position == lesson.section_position)
+            nav = [f'<a href="{href(path, index)}">{html.escape(course.title)}</a>',
+                   f'<h3>{section.position} {html.escape(section.title)}</h3><ol>']
+            for other in section.lessons:
+                other_path = page_path(course_name, lesson_files[other.lesson_id])
+                current = ' class="current"' if other.lesson_id == lesson.lesson_id else ''
+                nav.append(f'<li{current}><a href="{href(path, other_path)}">'
+                           f'{other.menu_number} {html.escape(other.title)}</a></li>')
+            nav.append('</ol><div class="pager">')
+            if i > 0:
+                previous, previous_path = lessons[i - 1]
+                nav.append(f'<a href="{href(path, previous_path)}">← {previous.menu_number}</a>')
+            if i + 1 < len(lessons):
+                following, following_path = lessons[i + 1]
+                nav.append(f'<a href="{href(path, following_path)}">{following.menu_number} →</a>')
+            nav.append('</div>')
+            self.add_page(path, f'{lesson.menu_number} {lesson.title}', '\n'.join(nav),
+                          lesson_file.read_text(encoding='utf-8'), [f'## {step.title}' for step in lesson.steps])
+
+        # Media are content-addressed: copy the ones not there yet
+        assets_dir = course_dir / 'assets'
+        if assets_dir.is_dir():
+            for source in assets_dir.glob('??/*'):
+                target = self.site_dir / course_name / 'assets' / source.relative_to(assets_dir)
+                if not target.exists():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(source, target)
+        return index
+
+    def build(self, workers: int = 0) -> Tuple[int, int]:
+        """Render queued pages (in worker processes if workers > 0) and remove stale ones; (rendered, removed)"""
+        if workers > 0 and len(self.tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(render_page, self.tasks, chunksize=max(1, len(self.tasks) // (workers * 4))))
+        else:
+            for task in self.tasks:
+                render_page(task)
+        removed = [path for path in self.built if path not in self.pages]
+        for path in removed:
+            (self.site_dir / path).unlink(missing_ok=True)
+        self.site_dir.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.state_file) as temp_file:
+            temp_file.write_text(json.dumps(self.pages, ensure_ascii=False, indent=0), encoding='utf-8')
+        return len(self.tasks), len(removed)
+
+def build_site(toc_files: List[Path], site_dir: Path, workers: Optional[int] = None) -> Tuple[int, int]:
+    """Build the site of exported courses into site_dir; (pages rendered, pages removed)"""
+    builder = SiteBuilder(site_dir)
+    indexes = [(Course.from_toc(toc_file).title, builder.add_course(toc_file)) for toc_file in toc_files]
+    catalogue = ''.join(f'<li><a href="{quote(index)}">{html.escape(title)}</a></li>' for title, index in indexes)
+    builder.add_page('index.html', 'Курсы', '', f'<h1>Курсы</h1><ul>{catalogue}</ul>')
+    return builder.build(settings.render_workers if workers is None else workers)
@@ -0,0 +1,106 @@
+# Step payloads kept within a memory budget, the rest spilled to disk
+import os
+import json
+import sqlite3
+import tempfile
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+@lru_cache(maxsize=None)
+def connect(path: str) -> sqlite3.Connection:
+    """Connection to a spill file (one per file and process)"""
+    return sqlite3.connect(path, check_same_thread=False)
+
+@lru_cache(maxsize=64)
+def load_block(path: str, key: int) -> dict:
+    """Spilled step block; recently used ones stay in memory"""
+    row = connect(path).execute('SELECT data FROM blocks WHERE id = ?', (key,)).fetchone()
+    return json.loads(row[0])
+
+def forget_connections():
+    """Drop connections and blocks inherited by a forked process (SQLite connections do not survive fork)"""
+    connect.cache_clear()
+    load_block.cache_clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=forget_connections)
+
+class SpilledBlock(Mapping):
+    """Step block stored in a spill file, loaded on access.
+
+    Pickles as the file path and key, so render worker processes read it
+    from the file too.
+    """
+
+    def __init__(self, path: str, key: int):
+        self.path = path
+        self.key = key
+
+    def __getitem__(self, name):
+        return load_block(self.path, self.key)[name]
+
+    def __iter__(self):
+        return iter(load_block(self.path, self.key))
+
+    def __len__(self) -> int:
+        return len(load_block(self.path, self.key))
+
+class PayloadStore:
+    """Step blocks of one export: in memory up to budget_bytes, then in a temporary SQLite file"""
+
+    def __init__(self, budget_bytes: Optional[int], directory: Optional[Path] = None):
+        self.budget_bytes = budget_bytes
+        self.directory = directory
+        self.in_memory = 0
+        self.spilled = 0
+        self.path = None
+        self.keys = set()
+
+    def put(self, key: int, block: dict) -> Mapping:
+        """Keep block, or spill it once the budget is used up; a block put before is returned as it is"""
+        if key in self.keys:
+            return block
+        self.keys.add(key)
+        data = json.dumps(block, ensure_ascii=False)
+        if self.budget_bytes is None or self.in_memory + len(data) <= self.budget_bytes:
+            self.in_memory += len(data)
+            return block
+        if self.path is None:
+            if self.directory:
+                self.directory.mkdir(parents=True, exist_ok=True)
+            fd, self.path = tempfile.mkstemp(prefix='spill_', suffix='.sqlite', dir=self.directory)
+            os.close(fd)
+            connect(self.path).execute('CREATE TABLE blocks (id INTEGER PRIMARY KEY, data TEXT)')
+        connect(self.path).execute('INSERT OR REPLACE INTO blocks VALUES (?, ?)', (key, data))
+        self.spilled += len(data)
+        return SpilledBlock(self.path, key)
+
+    def flush(self):
+        """Make spilled blocks readable (also from render worker processes)"""
+        if self.path:
+            connect(self.path).commit()
+
+    def close(self):
+        """Remove spill file; spilled blocks cannot be read after this"""
+        if self.path:
+            connect(self.path).close()
+            connect.cache_clear()
+            load_block.cache_clear()
+            os.remove(self.path)
+            self.path = None
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident memory of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if os.uname().sysname == 'Darwin' else peak / 1024
@@ -0,0 +1,115 @@
+# Course statistics and catalogue aggregation
+import io
+import re
+import csv
+import html
+import json
+import heapq
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+from . import settings
+
+tag_re = re.compile(r'<[^>]+>')
+stats_counters = ('steps', 'text_chars', 'code_steps', 'videos')
+
+def new_stats(**fields) -> dict:
+    """Empty statistics record"""
+    return dict(fields, steps=0, text_chars=0, code_steps=0, videos=0, step_types=Counter())
+
+def add_stats(total: dict, part: dict):
+    """Add counters of part to total"""
+    for key in stats_counters:
+        total[key] += part[key]
+    total['step_types'].update(part['step_types'])
+
+def course_stats(course: 'Course') -> dict:
+    """Statistics of a course per section and lesson, in one traversal of the tree"""
+    stats = new_stats(course_id=course.course_id, title=course.title, sections=[])
+    lessons = []
+    for section in course.sections:
+        section_stats = new_stats(id=section.section_id, position=section.position,
+                                  title=section.title, lessons=[])
+        for lesson in section.lessons:
+            lesson_stats = new_stats(id=lesson.lesson_id, menu=lesson.menu_number, title=lesson.title)
+            for step in lesson.steps:
+                lesson_stats['steps'] += 1
+                lesson_stats['step_types'][step.step_type] += 1
+                lesson_stats['text_chars'] += len(html.unescape(tag_re.sub('', step.content.get('text') or '')))
+                lesson_stats['code_steps'] += step.step_type == 'code'
+                lesson_stats['videos'] += step.step_type == 'video'
+            add_stats(section_stats, lesson_stats)
+            section_stats['lessons'].append(lesson_stats)
+            lessons.append(lesson_stats)
+        add_stats(stats, section_stats)
+        stats['sections'].append(section_stats)
+    stats['lessons'] = len(lessons)
+    stats['code_density'] = round(stats['code_steps'] / stats['steps'], 3) if stats['steps'] else 0.0
+    stats['largest_lessons'] = [
+        {'menu': l['menu'], 'id': l['id'], 'title': l['title'], 'text_chars': l['text_chars'], 'steps': l['steps']}
+        for l in heapq.nlargest(settings.largest_lessons_count, lessons, key=lambda l: l['text_chars'])]
+    return stats
+
+def merge_course_stats(parts: List[dict]) -> dict:
+    """Statistics of a course from statistics of its parts (e.g. one per section)"""
+    stats = new_stats(course_id=parts[0]['course_id'], title=parts[0]['title'], sections=[])
+    for part in parts:
+        part['step_types'] = Counter(part['step_types'])
+        add_stats(stats, part)
+        stats['sections'] += part['sections']
+    stats['sections'].sort(key=lambda s: s['position'])
+    lessons = [lesson for section in stats['sections'] for lesson in section['lessons']]
+    stats['lessons'] = len(lessons)
+    stats['code_density'] = round(stats['code_steps'] / stats['steps'], 3) if stats['steps'] else 0.0
+    stats['largest_lessons'] = heapq.nlargest(settings.largest_lessons_count,
+                                              [largest for part in parts for largest in part['largest_lessons']],
+                                              key=lambda l: l['text_chars'])
+    return stats
+
+def stats_to_json(stats: dict) -> str:
+    """Statistics as JSON text"""
+    return json.dumps(stats, ensure_ascii=False, indent=1)
+
+def stats_to_csv(stats: dict) -> str:
+    """Per-lesson statistics as CSV text, one column per step type"""
+    step_types = sorted(stats['step_types'])
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['course_id', 'section', 'menu', 'lesson_id', 'title', *stats_counters, *step_types])
+    for section in stats['sections']:
+        for lesson in section['lessons']:
+            writer.writerow([stats['course_id'], section['position'], lesson['menu'], lesson['id'],
+                             lesson['title'], *(lesson[key] for key in stats_counters),
+                             *(lesson['step_types'].get(t, 0) for t in step_types)])
+    return output.getvalue()
+
+def catalogue_stats(output_dir: Path) -> dict:
+    """Aggregate statistics files of all courses exported to output_dir"""
+    catalogue = new_stats(courses=[])
+    lessons = []
+    for stats_file in sorted(output_dir.glob('*/stats_*.json')):
+        with open(stats_file, encoding='utf-8') as f:
+            stats = json.load(f)
+        stats['step_types'] = Counter(stats['step_types'])
+        add_stats(catalogue, stats)
+        catalogue['courses'].append({key: stats[key] for key in
+                                     ('course_id', 'title', 'lessons', 'code_density', *stats_counters)})
+        lessons += [dict(l, course_id=stats['course_id']) for l in stats['largest_lessons']]
+    catalogue['lessons'] = sum(c['lessons'] for c in catalogue['courses'])
+    catalogue['code_density'] = (round(catalogue['code_steps'] / catalogue['steps'], 3)
+                                 if catalogue['steps'] else 0.0)
+    catalogue['largest_lessons'] = heapq.nlargest(settings.largest_lessons_count, lessons,
+                                                  key=lambda l: l['text_chars'])
+    return catalogue
+
+def catalogue_stats_to_csv(catalogue: dict) -> str:
+    """Per-course catalogue statistics as CSV text"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['course_id', 'title', 'lessons', 'code_density', *stats_counters])
+    for course in catalogue['courses']:
+        writer.writerow([course['course_id'], course['title'], course['lessons'], course['code_density'],
+                         *(course[key] for key in stats_counters)])
+    return output.getvalue()
+
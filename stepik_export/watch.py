@@ -0,0 +1,100 @@
+# Watch mode: poll a course for changes and re-export incrementally
+import json
+import time
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from . import api, settings
+from .api import fetch_object, fetch_objects
+from .diff import diff_courses
+from .models import Course, course_dir_name, is_unchanged
+
+def has_updates(course: Course) -> bool:
+    """Cheap check (a few requests) whether the course changed since it was fetched"""
+    course_data = fetch_object('course', course.course_id)
+    if (course_data.get('update_date') != course.update_date
+            or set(course_data['sections']) != {s.section_id for s in course.sections}):
+        return True
+    sections = {s.section_id: s for s in course.sections}
+    if any(not is_unchanged(sections.get(s['id']), s)
+           for s in fetch_objects('section', course_data['sections'])):
+        return True
+    lessons = {l.lesson_id: l for s in course.sections for l in s.lessons}
+    return any(not is_unchanged(lessons.get(l['id']), l)
+               for l in fetch_objects('lesson', list(lessons)))
+
+def serve_status(status: dict, port: int) -> ThreadingHTTPServer:
+    """Serve status dict as JSON on localhost in a background thread"""
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(status, ensure_ascii=False, indent=1).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', port), StatusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def watch(course_id: int, output_dir: Path, interval: int = 60, max_polls: Optional[int] = None):
+    """Export course, then keep polling it and re-export changed lessons"""
+    status = {'course_id': course_id, 'state': 'exporting', 'polls': 0, 'exports': 0,
+              'last_poll': None, 'last_export': None, 'last_changes': [], 'last_error': None}
+    serve_status(status, settings.status_port)
+    print(f"Status: http://127.0.0.1:{settings.status_port}/")
+    
+    course = Course.from_api(course_id)
+    toc_file = course.save_structure(output_dir, settings.download_media)
+    course_dir = toc_file.parent
+    status.update(state='watching', exports=1, last_export=time.strftime('%Y-%m-%d %H:%M:%S'))
+    print(f"Exported to {course_dir}, checking for changes every {interval} s")
+    
+    while max_polls is None or status['polls'] < max_polls:
+        time.sleep(interval)
+        status['polls'] += 1
+        status['last_poll'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            api.refresh_token()
+            if not has_updates(course):
+                continue
+            
+            new_course = Course.from_api(course_id, previous=course)
+            changes = diff_courses(course, new_course)
+            old_files = course.lesson_files()
+            new_files = new_course.lesson_files()
+            old_hashes = {l.lesson_id: l.content_hash for s in course.sections for l in s.lessons}
+            changed = {l.lesson_id for s in new_course.sections for l in s.lessons
+                       if old_files.get(l.lesson_id) != new_files[l.lesson_id]
+                       or old_hashes.get(l.lesson_id) != l.content_hash}
+            
+            if course_dir_name(new_course) != course_dir.name:
+                # Course was renamed: export it whole to its new directory
+                changed = set(new_files)
+                toc_file = new_course.save_structure(output_dir, settings.download_media)
+                shutil.rmtree(course_dir)
+                course_dir = toc_file.parent
+            else:
+                new_course.save_structure(output_dir, settings.download_media, only_lessons=changed)
+                # Files of removed and renumbered lessons
+                for path in set(old_files.values()) - set(new_files.values()):
+                    (course_dir / path).unlink(missing_ok=True)
+            
+            course = new_course
+            status.update(exports=status['exports'] + 1, last_error=None,
+                          last_export=time.strftime('%Y-%m-%d %H:%M:%S'),
+                          last_changes=[str(change) for change in changes])
+            print(f"{status['last_export']}: {len(changed)} lessons re-exported")
+            for change in changes:
+                print(f"  {change}")
+        except Exception as e:
+            status['last_error'] = f'{type(e).__name__}: {e}'
+            print(f"Error: {e}")
+
@@ -0,0 +1,154 @@
+# Shared queue of export jobs for distributed workers
+import time
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from . import settings
+
+@dataclass
+class Job:
+    """Export of a whole course, of one section of it, or merge (or discard) of exported sections"""
+    job_id: int
+    kind: str  # 'course', 'section', 'merge' or 'discard'
+    course_id: int
+    section: int = 0  # section position for 'section' jobs
+    attempts: int = 0
+
+    def __str__(self) -> str:
+        where = f' section {self.section}' if self.kind == 'section' else ''
+        return f'{self.kind} job {self.job_id}: course {self.course_id}{where}'
+
+class WorkQueue(ABC):
+    """Queue of jobs leased to workers.
+
+    A leased job goes back to the queue when its lease runs out without a
+    heartbeat (the worker crashed), until it has had max_attempts. When
+    the section jobs of a course are finished, a merge job is queued if
+    all of them are done, a discard job if any failed.
+    Leases compare wall clocks of the nodes, which should be in sync.
+    """
+
+    @abstractmethod
+    def put_course(self, course_id: int, sections: Iterable[int] = ()):
+        """Queue export of a course, as one job per section if sections are given"""
+
+    @abstractmethod
+    def claim(self, worker: str) -> Optional[Job]:
+        """Lease the next job to worker; None if there is none to take now"""
+
+    @abstractmethod
+    def heartbeat(self, job: Job, worker: str) -> bool:
+        """Extend the lease of job; False if worker has lost it"""
+
+    @abstractmethod
+    def complete(self, job: Job, worker: str, ok: bool, message: str = '', retry: bool = False):
+        """Record the result of job; queues the merge or discard job after the last section of a course.
+
+        A failed job is run again if retry (it failed by an exception), until it has had max_attempts.
+        """
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs by state: pending, leased, done, failed"""
+
+class SqliteWorkQueue(WorkQueue):
+    """Work queue in an SQLite file (on storage shared by the nodes)"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._transaction() as db:
+            db.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY, kind TEXT, course_id INTEGER, section INTEGER,
+                state TEXT, worker TEXT, lease_until REAL, attempts INTEGER, message TEXT,
+                UNIQUE (kind, course_id, section))''')
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # A connection per call: workers use the queue from several threads
+        db = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            yield db
+            db.execute('COMMIT')
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        finally:
+            db.close()
+
+    def put_course(self, course_id: int, sections: Iterable[int] = ()):
+        sections = list(sections)
+        with self._transaction() as db:
+            db.execute('DELETE FROM jobs WHERE course_id = ?', (course_id,))
+            jobs = [('section', section) for section in sections] if sections else [('course', 0)]
+            db.executemany("INSERT INTO jobs (kind, course_id, section, state, attempts) "
+                           "VALUES (?, ?, ?, 'pending', 0)",
+                           [(kind, course_id, section) for kind, section in jobs])
+
+    def claim(self, worker: str) -> Optional[Job]:
+        now = time.time()
+        with self._transaction() as db:
+            # Jobs of crashed workers that had their last attempt
+            expired = "FROM jobs WHERE state = 'leased' AND lease_until < ? AND attempts >= ?"
+            courses = [course_id for course_id, in db.execute(
+                f"SELECT DISTINCT course_id {expired} AND kind = 'section'", (now, settings.queue_max_attempts))]
+            db.execute(f"UPDATE jobs SET state = 'failed', message = 'lease expired' "
+                       f"WHERE id IN (SELECT id {expired})", (now, settings.queue_max_attempts))
+            for course_id in courses:
+                self._sections_finished(db, course_id)
+            row = db.execute("SELECT id, kind, course_id, section, attempts FROM jobs "
+                             "WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                             "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row:
+                db.execute("UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                           "WHERE id = ?", (worker, now + settings.queue_lease_seconds, row[0]))
+        return Job(row[0], row[1], row[2], row[3], row[4] + 1) if row else None
+
+    def heartbeat(self, job: Job, worker: str) -> bool:
+        with self._transaction() as db:
+            updated = db.execute("UPDATE jobs SET lease_until = ? "
+                                 "WHERE id = ? AND worker = ? AND state = 'leased'",
+                                 (time.time() + settings.queue_lease_seconds, job.job_id, worker)).rowcount
+        return bool(updated)
+
+    def complete(self, job: Job, worker: str, ok: bool, message: str = '', retry: bool = False):
+        retry = not ok and retry and job.attempts < settings.queue_max_attempts
+        state = 'done' if ok else 'pending' if retry else 'failed'
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET state = ?, message = ?, worker = NULL "
+                       "WHERE id = ? AND worker = ? AND state = 'leased'",
+                       (state, message, job.job_id, worker))
+            if job.kind == 'section':
+                self._sections_finished(db, job.course_id)
+
+    def _sections_finished(self, db: sqlite3.Connection, course_id: int):
+        # After the last section job of a course: merge the sections, or discard them if any failed
+        states = [state for state, in db.execute("SELECT state FROM jobs WHERE course_id = ? AND kind = 'section'",
+                                                 (course_id,))]
+        if any(state in ('pending', 'leased') for state in states):
+            return
+        kind = 'merge' if all(state == 'done' for state in states) else 'discard'
+        db.execute("INSERT OR IGNORE INTO jobs (kind, course_id, section, state, attempts) "
+                   "VALUES (?, ?, 0, 'pending', 0)", (kind, course_id))
+
+    def counts(self) -> Dict[str, int]:
+        with self._transaction() as db:
+            rows = db.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+        return dict(rows)
+
+queue_backends = {'sqlite': SqliteWorkQueue}
+
+def open_queue(location: str) -> WorkQueue:
+    """Open work queue: a path (SQLite) or BACKEND://PATH"""
+    backend, sep, path = location.partition('://')
+    if not sep:
+        backend, path = 'sqlite', location
+    if backend not in queue_backends:
+        raise ValueError(f'Unknown work queue backend: {backend}')
+    return queue_backends[backend](Path(path))
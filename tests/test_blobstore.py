@@ -0,0 +1,27 @@
+# Snapshots of exports in the content-addressed blob store
+import json
+
+from stepik_export.blobstore import BlobSink, restore_snapshot, snapshot_files
+from stepik_export.spill import PayloadStore, SpilledBlock
+
+def test_spilled_step_source_is_stored(tmp_path):
+    payloads = PayloadStore(0, tmp_path / 'cache')
+    block = {'name': 'text', 'text': '<p>Привет</p>'}
+    spilled = payloads.put(1, block)
+    payloads.flush()
+    assert isinstance(spilled, SpilledBlock)
+    sink = BlobSink(tmp_path, 'course_1')
+    key = sink.store_step_source(spilled)
+    # Same blob as for the block kept in memory
+    assert sink.store_step_source(dict(block)) == key
+    assert json.loads(sink.store.path(key).read_text(encoding='utf-8')) == block
+    payloads.close()
+
+def test_snapshots_started_together_are_kept_apart(tmp_path):
+    for text in ('first', 'second'):
+        with BlobSink(tmp_path, 'course_1') as sink:
+            sink.write_text('course/left_menu.txt', text)
+    first, second = snapshot_files(tmp_path)
+    restore_snapshot(second, tmp_path / 'restored')
+    assert (tmp_path / 'restored' / 'course' / 'left_menu.txt').read_text(encoding='utf-8') == 'second'
+    assert first != second
@@ -0,0 +1,68 @@
+# Retries of batched API requests, against scripted responses
+import json
+
+import pytest
+import requests
+
+from stepik_export import api, settings
+from stepik_export.errors import ErrorLog
+
+@pytest.fixture
+def responses(monkeypatch):
+    """Script get_content: the queued answers first, then the requested objects"""
+    queued = []
+    requested = []
+
+    def get_content(api_url, obj_class='', obj_ids=()):
+        requested.append(list(obj_ids))
+        answer = queued.pop(0) if queued else 200
+        if isinstance(answer, Exception):
+            raise answer
+        if isinstance(answer, bytes):
+            return 200, answer, False
+        if answer == 200:
+            return 200, json.dumps({'lessons': [{'id': obj_id} for obj_id in obj_ids]}).encode(), False
+        return answer, b'error', False
+
+    monkeypatch.setattr(api, 'get_content', get_content)
+    monkeypatch.setattr(api.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(settings, 'response_cache_file', None)
+    monkeypatch.setattr(settings, 'max_batch_retries', 3)
+    monkeypatch.setitem(api.batch_sizers, 'lesson', api.BatchSizer(10, 1, 100))
+    return queued, requested
+
+@pytest.mark.parametrize('answer', [500, 503, 429, 413, requests.Timeout('slow')])
+def test_overload_is_retried_with_smaller_batch(responses, answer):
+    queued, requested = responses
+    queued += [answer, answer]
+    objs = api.fetch_objects('lesson', list(range(1, 11)), trimmed=False)
+    assert [obj['id'] for obj in objs] == list(range(1, 11))
+    assert [len(ids) for ids in requested[:3]] == [10, 5, 2]
+
+@pytest.mark.parametrize('answer', [400, 403, 404])
+def test_client_error_is_not_retried(responses, answer):
+    queued, requested = responses
+    queued.append(answer)
+    with pytest.raises(RuntimeError):
+        api.fetch_objects('lesson', list(range(1, 11)), trimmed=False)
+    assert len(requested) == 1
+    assert api.batch_sizers['lesson'].size == 10
+
+def test_undecodable_body_is_set_aside(responses):
+    queued, requested = responses
+    queued += [b'<html>'] * 3
+    errors = ErrorLog()
+    assert api.fetch_objects('lesson', [1, 2], errors=errors, trimmed=False) == []
+    # The batch once, then each id once in the final sweep
+    assert requested == [[1, 2], [1], [2]]
+    assert len(errors) == 2
+
+def test_retries_run_out(responses):
+    queued, requested = responses
+    queued += [500] * 4
+    errors = ErrorLog()
+    objs = api.fetch_objects('lesson', [1, 2], errors=errors, trimmed=False)
+    assert sorted(obj['id'] for obj in objs) == [1, 2]
+    # Four tries of a shrinking batch, the rest of the ids, then the set aside id alone
+    assert requested == [[1, 2], [1, 2], [1, 2], [1], [2], [1]]
+    assert not errors
@@ -0,0 +1,68 @@
+# Round trips of step text: HTML -> Markdown (export) -> HTML (deploy)
+import pytest
+
+from stepik_export.html_markdown import HtmlToMarkdown
+from stepik_export.markdown_html import inline_to_html, markdown_to_html
+
+def to_markdown(html: str) -> str:
+    return HtmlToMarkdown().convert(html)
+
+@pytest.mark.parametrize('html', [
+    '<p>Some <strong>bold</strong> and <em>italic</em> text</p>',
+    '<p>Use <code>x = 1</code> here</p>',
+    '<h2>1. Introduction</h2>',
+    '<ul><li>one</li><li>two</li></ul>',
+    '<ol><li>first</li><li>second</li></ol>',
+    '<blockquote><p>quoted</p></blockquote>',
+    '<pre><code class="language-python">if x &lt; 2:\n    pass</code></pre>',
+    '<p>Formula $$a*b_c$$ and \\(y\\)</p>',
+    '<p><a href="https://example.com/?a=1&amp;b=2">link</a></p>',
+    # Blank lines and trailing spaces in code are kept
+    '<pre><code>import os\n\n\ndef f():  \n    pass</code></pre>',
+    '<ul><li><p>item</p><pre><code>a = 1\n\n\nb = 2</code></pre></li></ul>',
+])
+def test_markup_round_trip(html):
+    assert markdown_to_html(to_markdown(html)) == html
+
+@pytest.mark.parametrize('html', [
+    # Character references are text, not markup
+    '<p>Use &lt;div&gt; and &amp;lt; for a &lt; b &amp; c</p>',
+    '<p>Escaped \\ backslash, *stars*, _underscores_ and `ticks`</p>',
+    # Block markers at the start of a paragraph or line are text
+    '<p>1. not a list</p>',
+    '<p>2) not a list either</p>',
+    '<p># not a heading</p>',
+    '<p>&gt; not a quote</p>',
+    '<p>- not an item</p>',
+    '<p>+ not an item</p>',
+    '<p>first line<br>3. second line<br>---</p>',
+    '<blockquote><p># quoted text</p></blockquote>',
+    # Brackets are text, not a link
+    '<p>x [a](y) and [b]</p>',
+])
+def test_text_round_trip(html):
+    assert markdown_to_html(to_markdown(html)) == html
+
+def test_markers_inside_text_are_not_escaped():
+    assert to_markdown('<p>See 1. and # and - here</p>') == 'See 1. and # and - here'
+    assert to_markdown('<p>-5 degrees</p>') == '-5 degrees'
+
+def test_code_block_kept_verbatim():
+    assert to_markdown('<pre><code>import os\n\n\ndef f():  \n    pass</code></pre>') == \
+        '```\nimport os\n\n\ndef f():  \n    pass\n```'
+
+def test_image_alt_text():
+    markdown = to_markdown('<p><img src="a.png" alt="x]y\\z"></p>')
+    assert markdown == '![x\\]y\\\\z](a.png)'
+    assert markdown_to_html(markdown) == '<p><img src="a.png" alt="x]y\\z"></p>'
+
+def test_image_attributes_escaped_once():
+    assert inline_to_html('![a&b](x.png?a=1&b=2)') == '<img src="x.png?a=1&amp;b=2" alt="a&amp;b">'
+
+def test_escaped_backticks_are_not_code():
+    assert inline_to_html('\\`d\\`') == '`d`'
+    assert inline_to_html('\\`a\\` and `b`') == '`a` and <code>b</code>'
+
+def test_backslashes_in_code_spans_are_literal():
+    assert inline_to_html('`a\\*b`') == '<code>a\\*b</code>'
+    assert inline_to_html('`C:\\`') == '<code>C:\\</code>'
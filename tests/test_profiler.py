@@ -0,0 +1,17 @@
+# Pipeline stages of sampled stacks (innermost frame first)
+import pytest
+
+from stepik_export.profiler import stage_of
+
+@pytest.mark.parametrize('frames, stage', [
+    ([('json.decoder', 'raw_decode'), ('json', 'loads'), ('stepik_export.api', 'decode_objects')], 'json decode'),
+    # orjson.loads has no frame: the sample stops in decode_objects
+    ([('stepik_export.api', 'decode_objects'), ('stepik_export.api', 'fetch_objects')], 'json decode'),
+    ([('json.encoder', 'iterencode'), ('json', 'dumps'), ('stepik_export.journal', '_write')], 'disk write'),
+    ([('json.encoder', 'encode'), ('stepik_export.models', 'content_digest'), ('stepik_export.models', 'from_api')],
+     'from_api assembly'),
+    ([('ssl', 'read'), ('urllib3.response', 'read'), ('stepik_export.api', 'get_content')], 'fetch wait'),
+    ([('stepik_export.cli', 'main')], 'other'),
+])
+def test_stage_of(frames, stage):
+    assert stage_of(frames) == stage
@@ -0,0 +1,80 @@
+# Selecting part of a course (--sections/--lessons) and merging it into the exported course
+import pytest
+
+from stepik_export.models import Course, Lesson, Section, Step
+from stepik_export.selection import CourseSelection
+
+def make_course(*sections) -> Course:
+    """Course from (position, section_id, title, [lesson ids]) tuples"""
+    course = Course(course_id=1, title='Course', sections=[
+        Section(position=position, section_id=section_id, title=title, lessons=[
+            Lesson(section_position=position, lesson_position=i, lesson_id=lesson_id,
+                   title=f'Lesson {lesson_id}',
+                   steps=[Step(position=1, step_id=lesson_id * 10, step_type='text',
+                               content={'text': f'<p>{lesson_id}</p>'})])
+            for i, lesson_id in enumerate(lesson_ids, 1)])
+        for position, section_id, title, lesson_ids in sections])
+    course.update_hashes()
+    return course
+
+def layout(course: Course) -> list:
+    return [(s.position, s.section_id, s.title, [(l.section_position, l.lesson_position, l.lesson_id)
+                                                 for l in s.lessons])
+            for s in course.sections]
+
+def test_parse_sections():
+    selection = CourseSelection.parse(sections='1, 3-5')
+    assert selection.sections == {1, 3, 4, 5}
+    assert selection.includes_section(4) and not selection.includes_section(2)
+
+def test_parse_lessons():
+    selection = CourseSelection.parse(lessons='2.3-3.1, 1.2, 12345')
+    assert selection.lesson_ranges == [((2, 3), (3, 1)), ((1, 2), (1, 2))]
+    assert selection.lesson_ids == {12345}
+    assert selection.includes_lesson(2, 9, 1) and selection.includes_lesson(3, 1, 1)
+    assert not selection.includes_lesson(3, 2, 1) and not selection.includes_lesson(1, 3, 1)
+    assert selection.includes_lesson(7, 7, 12345)
+
+@pytest.mark.parametrize('sections, lessons', [
+    ('1-', ''), ('a', ''), ('1.2', ''), ('5-3', ''),
+    ('', '1.'), ('', '1.2-3'), ('', '2.1-1.5'), ('', 'x'),
+])
+def test_parse_bad_syntax(sections, lessons):
+    with pytest.raises(ValueError):
+        CourseSelection.parse(sections=sections, lessons=lessons)
+
+def test_merge_renamed_section_keeps_unselected_lessons():
+    exported = make_course((1, 100, 'A', [11, 12]), (2, 200, 'B', [21, 22]))
+    partial = make_course((2, 200, 'B renamed', [21]))
+    merged = exported.merge_selection(partial, CourseSelection.parse(lessons='2.1'))
+    assert layout(merged) == [
+        (1, 100, 'A', [(1, 1, 11), (1, 2, 12)]),
+        (2, 200, 'B renamed', [(2, 1, 21), (2, 2, 22)]),
+    ]
+    assert merged.content_hash != exported.content_hash
+
+def test_merge_moved_sections():
+    exported = make_course((1, 100, 'A', [11]), (2, 200, 'B', [21, 22]), (3, 300, 'C', [31]))
+    # B moved to the top and renamed, A is second now
+    partial = make_course((1, 200, 'B2', [21, 22]), (2, 100, 'A', [11]))
+    merged = exported.merge_selection(partial, CourseSelection.parse(sections='1-2'))
+    assert layout(merged) == [
+        (1, 200, 'B2', [(1, 1, 21), (1, 2, 22)]),
+        (2, 100, 'A', [(2, 1, 11)]),
+        (3, 300, 'C', [(3, 1, 31)]),
+    ]
+
+def test_merge_lesson_moved_into_selected_section():
+    exported = make_course((1, 100, 'A', [11]), (2, 200, 'B', [21, 22]))
+    partial = make_course((1, 100, 'A', [11, 22]))
+    merged = exported.merge_selection(partial, CourseSelection.parse(sections='1'))
+    assert layout(merged) == [
+        (1, 100, 'A', [(1, 1, 11), (1, 2, 22)]),
+        (2, 200, 'B', [(2, 1, 21)]),
+    ]
+
+def test_merge_drops_removed_section():
+    exported = make_course((1, 100, 'A', [11]), (2, 200, 'B', [21]))
+    partial = make_course((1, 100, 'A', [11]))
+    merged = exported.merge_selection(partial, CourseSelection.parse(sections='1-2'))
+    assert layout(merged) == [(1, 100, 'A', [(1, 1, 11)])]
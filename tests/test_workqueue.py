@@ -0,0 +1,88 @@
+# Leases, retries and section merges of the SQLite work queue
+import sqlite3
+
+import pytest
+
+from stepik_export import settings
+from stepik_export.workqueue import SqliteWorkQueue
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'queue_max_attempts', 2)
+    return SqliteWorkQueue(tmp_path / 'queue.db')
+
+def expire_leases(queue: SqliteWorkQueue):
+    """Make every lease run out, as if its worker crashed"""
+    with sqlite3.connect(queue.path) as db:
+        db.execute("UPDATE jobs SET lease_until = 0 WHERE state = 'leased'")
+
+def test_claim_in_order(queue):
+    queue.put_course(1)
+    queue.put_course(2, [1, 2])
+    jobs = [queue.claim('w') for _ in range(4)]
+    assert [(job.kind, job.course_id, job.section, job.attempts) for job in jobs[:3]] == [
+        ('course', 1, 0, 1), ('section', 2, 1, 1), ('section', 2, 2, 1)]
+    assert jobs[3] is None
+    assert queue.counts() == {'leased': 3}
+
+def test_requeued_course_replaces_its_jobs(queue):
+    queue.put_course(1, [1, 2])
+    queue.put_course(1)
+    assert queue.claim('w').kind == 'course'
+    assert queue.claim('w') is None
+
+def test_expired_lease_goes_to_another_worker(queue):
+    queue.put_course(1)
+    job = queue.claim('a')
+    assert queue.heartbeat(job, 'a')
+    expire_leases(queue)
+    again = queue.claim('b')
+    assert (again.job_id, again.attempts) == (job.job_id, 2)
+    # The crashed worker has lost the job
+    assert not queue.heartbeat(job, 'a')
+    queue.complete(job, 'a', True)
+    assert queue.counts() == {'leased': 1}
+
+def test_lease_expired_on_last_attempt_fails_job(queue):
+    queue.put_course(1, [1])
+    queue.claim('a')
+    expire_leases(queue)
+    queue.claim('a')
+    expire_leases(queue)
+    discard = queue.claim('b')
+    assert (discard.kind, discard.course_id) == ('discard', 1)
+    assert queue.counts() == {'failed': 1, 'leased': 1}
+
+def test_complete(queue):
+    queue.put_course(1)
+    queue.put_course(2)
+    queue.put_course(3)
+    first, second, third = queue.claim('w'), queue.claim('w'), queue.claim('w')
+    queue.complete(first, 'w', True)
+    queue.complete(second, 'w', False, 'no course')
+    queue.complete(third, 'w', False, 'RuntimeError: timeout', retry=True)
+    assert queue.counts() == {'done': 1, 'failed': 1, 'pending': 1}
+    third = queue.claim('w')
+    assert third.attempts == 2
+    # Out of attempts
+    queue.complete(third, 'w', False, 'RuntimeError: timeout', retry=True)
+    assert queue.counts() == {'done': 1, 'failed': 2}
+
+def test_sections_done_are_merged(queue):
+    queue.put_course(1, [1, 2])
+    first, second = queue.claim('w'), queue.claim('w')
+    queue.complete(first, 'w', True)
+    assert queue.claim('w') is None
+    queue.complete(second, 'w', True)
+    merge = queue.claim('w')
+    assert (merge.kind, merge.course_id) == ('merge', 1)
+
+def test_failed_section_discards_course(queue):
+    queue.put_course(1, [1, 2])
+    first, second = queue.claim('w'), queue.claim('w')
+    queue.complete(first, 'w', False, 'RuntimeError: no section')
+    queue.complete(second, 'w', True)
+    discard = queue.claim('w')
+    assert (discard.kind, discard.course_id) == ('discard', 1)
+    queue.complete(discard, 'w', False)
+    assert queue.counts() == {'done': 1, 'failed': 2}